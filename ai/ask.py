@@ -1,8 +1,6 @@
-from google import genai
-from google.genai import types
-import os 
+import gemini
 
-client = genai.Client(api_key=os.environ["GOOGLE_API_KEY"])
+client = gemini.connect()
 
 
 sample = client.files.upload(
@@ -16,4 +14,4 @@ response = client.models.generate_content(
     contents=[sample, "hwhat is this about "],
 )
 
-print(response.text)
\ No newline at end of file
+print(response.text)
@@ -0,0 +1,224 @@
+"""
+Tessellation of STEP assemblies one solid at a time.
+
+Meshing the whole compound at once holds every solid's triangulation and
+its Python vertex lists at the same time. Here each solid is meshed on its
+own, copied into one growing float32/int32 buffer and its triangulation is
+dropped again. Solids with more than LARGE_SOLID_FACES faces go as BRep
+bytes to a helper pool of at most SOLID_WORKERS processes, so their peak
+memory is paid in another process. The pool is started by the first
+large solid of an assembly and shut down once the assembly is meshed, so
+the worst case is CONVERT_WORKERS x (1 + SOLID_WORKERS) processes, each
+under WORKER_RSS_LIMIT, and only while large assemblies are meshed. Past
+COARSEN_FROM of the cap the remaining solids are tessellated coarser, and
+once a process is over the cap (or out of memory past MAX_COARSENING) a
+solid is drawn as its bounding box instead of failing the conversion.
+"""
+import io
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import lazy
+import tracing
+
+# ---- CONFIG: STEP assemblies ----
+WORKER_RSS_LIMIT = int(os.environ.get("QUOTE_WORKER_RSS_MB") or 4096) * 1024 ** 2
+COARSEN_FROM = 0.5         # fraction of the cap above which solids are meshed coarser
+COARSEN_FACTOR = 2.0       # tolerance multiplier per coarsening step
+MAX_COARSENING = 4         # steps at the cap (or on MemoryError) before solids become bounding boxes
+LARGE_SOLID_FACES = 2000   # solids with more B-rep faces are meshed in a helper process
+SOLID_WORKERS = 2          # helper processes per assembly being meshed; 0 meshes everything in-process
+# ---------------------------------
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes():
+    """Resident memory of this process (Linux /proc; peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MeshBuffer:
+    """
+    Vertex and triangle arrays filled one solid at a time. Capacity doubles
+    when a solid does not fit, so appends are amortised O(size of the solid)
+    and only the buffers themselves hold the whole mesh.
+    """
+
+    def __init__(self, vertices=65_536, triangles=131_072):
+        np = lazy.load("numpy")
+        self._vertices = np.empty((vertices, 3), dtype=np.float32)
+        self._triangles = np.empty((triangles, 3), dtype=np.int32)
+        self.n_vertices = 0
+        self.n_triangles = 0
+
+    @staticmethod
+    def _grow(array, needed):
+        np = lazy.load("numpy")
+        if needed <= len(array):
+            return array
+        grown = np.empty((max(needed, 2 * len(array)), 3), dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def append(self, vertices, triangles):
+        v_end = self.n_vertices + len(vertices)
+        t_end = self.n_triangles + len(triangles)
+        self._vertices = self._grow(self._vertices, v_end)
+        self._triangles = self._grow(self._triangles, t_end)
+        self._vertices[self.n_vertices:v_end] = vertices
+        self._triangles[self.n_triangles:t_end] = triangles
+        self._triangles[self.n_triangles:t_end] += self.n_vertices
+        self.n_vertices, self.n_triangles = v_end, t_end
+
+    @property
+    def nbytes(self):
+        return self._vertices.nbytes + self._triangles.nbytes
+
+    def arrays(self):
+        """(vertices (N, 3) float32, triangles (M, 3) int32), shrunk in place to what was written."""
+        self._vertices.resize((self.n_vertices, 3), refcheck=False)
+        self._triangles.resize((self.n_triangles, 3), refcheck=False)
+        return self._vertices, self._triangles
+
+
+def solids(shape):
+    """The solids of a Shape, or the shape itself when it has none (shells, faces)."""
+    return list(shape.Solids()) or [shape]
+
+
+def box_mesh(shape):
+    """12-triangle mesh of a shape's bounding box."""
+    np = lazy.load("numpy")
+    bb = shape.BoundingBox()
+    xs, ys, zs = (bb.xmin, bb.xmax), (bb.ymin, bb.ymax), (bb.zmin, bb.zmax)
+    vertices = np.array([(xs[i & 1], ys[i >> 1 & 1], zs[i >> 2]) for i in range(8)], dtype=np.float32)
+    triangles = np.array([(0, 2, 1), (1, 2, 3), (4, 5, 6), (5, 7, 6), (0, 1, 4), (1, 5, 4),
+                          (2, 6, 3), (3, 6, 7), (0, 4, 2), (2, 4, 6), (1, 3, 5), (3, 7, 5)], dtype=np.int32)
+    return vertices, triangles
+
+
+def release_mesh(shape):
+    """Drop the triangulation OCCT keeps on the shape's faces after tessellating."""
+    try:
+        BRepTools = lazy.load("OCP.BRepTools").BRepTools
+    except ImportError:
+        return
+    BRepTools.Clean_s(shape.wrapped)
+
+
+def coarsening_steps(rss, rss_limit):
+    """
+    Coarsening steps for the next solid at this RSS: 0 up to COARSEN_FROM
+    of rss_limit, rising linearly to MAX_COARSENING at the cap, and None
+    over the cap (draw a bounding box).
+    """
+    if rss > rss_limit:
+        return None
+    soft = COARSEN_FROM * rss_limit
+    if rss <= soft:
+        return 0
+    return min(MAX_COARSENING, int(-(-MAX_COARSENING * (rss - soft) // (rss_limit - soft))))
+
+
+def tessellate_solid(shape, tolerance, angular_tolerance, rss_limit=WORKER_RSS_LIMIT):
+    """
+    Mesh one solid, coarser the closer this process is to rss_limit and
+    again on MemoryError. Returns (vertices float32, triangles int32,
+    tolerance used); the arrays are the bounding box (tolerance None) when
+    the process is over rss_limit or MAX_COARSENING is used up.
+    """
+    np = lazy.load("numpy")
+    step = coarsening_steps(rss_bytes(), rss_limit)
+    while step is not None and step <= MAX_COARSENING:
+        used = tolerance * COARSEN_FACTOR ** step
+        try:
+            verts, tris = shape.tessellate(used, angular_tolerance)
+            vertices = np.array([v.toTuple() for v in verts], dtype=np.float32).reshape(-1, 3)
+            triangles = np.array(tris, dtype=np.int32).reshape(-1, 3)
+            return vertices, triangles, used
+        except MemoryError:
+            step += 1
+        finally:
+            release_mesh(shape)
+    vertices, triangles = box_mesh(shape)
+    return vertices, triangles, None
+
+
+def _tessellate_brep(brep, tolerance, angular_tolerance, rss_limit):
+    """Helper process side: rebuild a solid from BRep bytes and mesh it."""
+    cq = lazy.load("cadquery")
+    return tessellate_solid(cq.Shape.importBrep(io.BytesIO(brep)), tolerance, angular_tolerance, rss_limit)
+
+
+def _brep_bytes(shape):
+    buffer = io.BytesIO()
+    shape.exportBrep(buffer)
+    return buffer.getvalue()
+
+
+def degraded(info):
+    """True if a conversion's mesh was coarsened or boxed to stay under the memory cap."""
+    return bool(info.get("coarsened") or info.get("boxed"))
+
+
+def tessellate_assembly(shape, tolerance, angular_tolerance, rss_limit=WORKER_RSS_LIMIT):
+    """
+    Tessellate shape solid by solid into one MeshBuffer.
+    Returns (vertices (N, 3) float32, triangles (M, 3) int32, info) where
+    info counts the solids, those meshed in helper processes, coarsened or
+    drawn as boxes, and the coarsest tolerance used.
+    """
+    parts = solids(shape)
+    buffer = MeshBuffer()
+    info = {"solids": len(parts), "offloaded": 0, "coarsened": 0, "boxed": 0, "max_tolerance": tolerance}
+
+    def add(vertices, triangles, used):
+        buffer.append(vertices, triangles)
+        if used is None:
+            info["boxed"] += 1
+        elif used > tolerance:
+            info["coarsened"] += 1
+            info["max_tolerance"] = max(info["max_tolerance"], used)
+
+    offload = SOLID_WORKERS > 0 and len(parts) > 1
+    pool = None
+    pending = {}
+    try:
+        for i, solid in enumerate(parts):
+            if offload and len(solid.Faces()) > LARGE_SOLID_FACES:
+                if pool is None:
+                    pool = ProcessPoolExecutor(max_workers=SOLID_WORKERS,
+                                               mp_context=multiprocessing.get_context("spawn"))
+                future = pool.submit(_tessellate_brep, _brep_bytes(solid), tolerance, angular_tolerance, rss_limit)
+                pending[future] = i
+                continue
+            with tracing.span("solid.tessellate") as s:
+                vertices, triangles, used = tessellate_solid(solid, tolerance, angular_tolerance, rss_limit)
+                s.set(triangles=len(triangles))
+            add(vertices, triangles, used)
+
+        for future in as_completed(pending):
+            solid = parts[pending[future]]
+            try:
+                vertices, triangles, used = future.result()
+                info["offloaded"] += 1
+            except Exception as e:   # BrokenProcessPool when the helper was killed, OCCT errors
+                print(f"Solid {pending[future]} failed in helper process ({e}); meshing it here")
+                vertices, triangles, used = tessellate_solid(solid, tolerance * COARSEN_FACTOR,
+                                                             angular_tolerance, rss_limit)
+            add(vertices, triangles, used)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    vertices, triangles = buffer.arrays()
+    if info["coarsened"] or info["boxed"]:
+        print(f"⚠️ Mesh reduced to stay under {rss_limit // 1024 ** 2} MB: {info['coarsened']} solid(s) coarsened "
+              f"(up to {info['max_tolerance']:.3f} mm), {info['boxed']} drawn as bounding boxes")
+    return vertices, triangles, info
@@ -1,196 +1,160 @@
 import os
-import shutil
-import tempfile
-import pandas as pd
-from google import genai
-import cadquery as cq
-import pyvista as pv
+import gemini
+from contextlib import ExitStack
+import conversion
+import grouping
+import prompts
+import tracing
+from cache import ArtifactCache
+from journal import Journal
+from scanner import iter_files
+from uploads import UploadIndex
+from responses import ResponseCache
+from report import ReportWriter, RowParser
+from components import ComponentParser, ComponentStore, JSON_INSTRUCTIONS
 
 # ---- CONFIG: Set your PNG output directory here ----
+# (created on first use, not at import)
 OUTPUT_IMAGES_DIR = os.path.join(os.getcwd(), "generated_pngs")
-os.makedirs(OUTPUT_IMAGES_DIR, exist_ok=True)
-
 OUTPUT_STL_DIR = os.path.join(os.getcwd(), "generated_stls")
-os.makedirs(OUTPUT_STL_DIR, exist_ok=True)
 # ---------------------------------------------------
 
-def scan_files(input_folder):
-    """Return a list of (relative_path, abs_path, ext) for all files under input_folder"""
-    file_list = []
-    for root, _, files in os.walk(input_folder):
-        for file in files:
-            abs_path = os.path.join(root, file)
-            rel_path = os.path.relpath(abs_path, input_folder)
-            ext = os.path.splitext(file)[-1].lower()
-            file_list.append((rel_path, abs_path, ext))
-    return file_list
-
-def convert_stp_to_image(stp_path, output_image_path):
-    """Convert STP file to PNG image via STL conversion, saving STL as permanent file."""
-    try:
-        # Import STP and convert to STL
-        shape = cq.importers.importStep(stp_path)
-
-        # Set up STL path (named after the original file)
-        base_name = os.path.splitext(os.path.basename(stp_path))[0]
-        stl_path = os.path.join(OUTPUT_STL_DIR, f"{base_name}.stl")
-        cq.exporters.export(shape, stl_path)
-
-        # Set up PyVista plotter for off-screen rendering
-        plotter = pv.Plotter(off_screen=True)
-        mesh = pv.read(stl_path)
-        plotter.add_mesh(mesh, color='tan', show_edges=False)
-        plotter.camera_position = 'iso'  # Isometric view
-
-        # Save screenshot
-        plotter.screenshot(output_image_path, window_size=[1920, 1080])
-        plotter.close()
-
-        # No temp STL to delete; file is permanent now!
-        return True
-
-    except Exception as e:
-        print(f"Error converting STP to image: {e}")
-        return False
-
-
-def upload_files(file_list, client):
-    """Uploads PDFs, Excels (as CSV), PPTX (as PDF), STP (as PNG). Returns dict: rel_path -> file_obj or None."""
-    uploaded = {}
-    for rel_path, abs_path, ext in file_list:
-        try:
-            if ext == '.pdf':
-                obj = client.files.upload(file=abs_path, config=dict(mime_type='application/pdf'))
-                uploaded[rel_path] = obj
-                print(f"Uploaded PDF: {rel_path}")
-                
-            elif ext in ('.xls', '.xlsx'):
-                df = pd.read_excel(abs_path)
-                with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as tmp:
-                    csv_path = tmp.name
-                    df.to_csv(csv_path, index=False)
-                obj = client.files.upload(file=csv_path, config=dict(mime_type='text/csv'))
-                uploaded[rel_path] = obj
-                print(f"Excel converted & uploaded as CSV: {rel_path}")
-                os.unlink(csv_path)
-                
-            elif ext == '.pptx':
-                output_dir = os.path.dirname(abs_path)
-                base_name = os.path.splitext(os.path.basename(abs_path))[0]
-                pdf_path = os.path.join(output_dir, base_name + '.pdf')
-                cmd = [
-                    "libreoffice", "--headless", "--convert-to", "pdf", "--outdir", output_dir, abs_path
-                ]
-                result = os.system(' '.join(f'"{c}"' if ' ' in c else c for c in cmd))
-                if result != 0 or not os.path.isfile(pdf_path):
-                    raise RuntimeError(f"LibreOffice failed for {rel_path}")
-                obj = client.files.upload(file=pdf_path, config=dict(mime_type='application/pdf'))
-                uploaded[rel_path] = obj
-                print(f"PPTX converted & uploaded as PDF: {rel_path}")
-                os.unlink(pdf_path)
-                
-            elif ext == '.stp':
-                # Convert STP to PNG image
-                with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_img:
-                    png_path = tmp_img.name
-                
-                if convert_stp_to_image(abs_path, png_path):
-                    # Save a permanent copy of PNG
-                    final_png_name = os.path.splitext(os.path.basename(rel_path))[0] + ".png"
-                    final_png_path = os.path.join(OUTPUT_IMAGES_DIR, final_png_name)
-                    shutil.copy2(png_path, final_png_path)
-                    
-                    obj = client.files.upload(file=png_path, config=dict(mime_type='image/png'))
-                    uploaded[rel_path] = obj
-                    print(f"STP converted & uploaded as PNG: {rel_path} (saved at {final_png_path})")
-                    os.unlink(png_path)
-                else:
-                    uploaded[rel_path] = None
-                    print(f"Failed to convert STP: {rel_path}")
-                    
-            else:
-                uploaded[rel_path] = None  # Not supported
-                
-        except Exception as e:
-            print(f"Failed to process {rel_path}: {e}")
-            uploaded[rel_path] = None
-    return uploaded
-
-def analyze_uploaded_files(uploaded_files: dict, repo_name: str, client):
+def upload_files(file_list, client, converters=None, office=None, dwg=None, journal=None, fingerprints=None):
+    """Uploads PDFs and DWG/DXF, Excels (as CSV), PPTX (as PDF), STP (as PNG). Returns dict: rel_path -> file_obj or None."""
+    return conversion.upload_files(file_list, client, png_dir=OUTPUT_IMAGES_DIR, stl_dir=OUTPUT_STL_DIR,
+                                   cache=ArtifactCache("conversions"), index=UploadIndex(),
+                                   converters=converters, office=office, dwg=dwg, journal=journal,
+                                   fingerprints=fingerprints)
+
+def analyze_uploaded_files(uploaded_files: dict, repo_name: str, client, groups=None, refresh=False,
+                           store=None, folder=None, journal=None):
+    """
+    Ask the model for one JSON component per line, stream the validated
+    rows into <repo_name>_components.html, then save them to store
+    (a ComponentStore) as the job of folder, named repo_name. Returns the
+    Components, or None when the analysis failed or a batch got no answer.
+    The store is only updated when every batch has an answer, so a failed
+    rerun never replaces a complete job. With journal, answered batches
+    are recorded and the job is marked finished under the same condition.
+    """
     if not uploaded_files:
         print("No files to analyze.")
-        return
+        if journal is not None:
+            # Nothing left to resume: the next run of the folder starts afresh
+            journal.finish()
+        return []
 
     instructions = (
         """
         From the customer's uploaded folder, carefully analyze it and seperate it into individual components with their respective attributes.  
-        Generate the HTML rows (<tr> and <td> tags precisely) in simplified format as shown below. 
-
-        Example of expected format:
-
-        <tr>
-            <td>产品名称</td>
-            <td>材料</td>
-            <td>数量</td>
-            <td>规格</td>
-        </tr>
 
         - Precisely one row per inferred component.
-        - 产品名称 should be STP filename without ".stp".
-        - 规格 refers to the surface finish. 
+        - Files listed under one COMPONENT header are the same part: give it one row.
         - Infer  materials, quantities, and specifications.
-
-        Provide ONLY exact HTML rows, no explanations or other markup at all.
-        """
+        """ + JSON_INSTRUCTIONS
     )
     
-    parts = []
-    parts.append(f"Project Directory: {repo_name}/\n")
-    for rel_path, file_obj in uploaded_files.items():
-        if file_obj is not None:
-            file_note = " (converted to image for analysis)" if rel_path.lower().endswith('.stp') else ""
-            parts.extend([
-                f"--- FILE: {rel_path}{file_note} ---",
-                file_obj,
-                "\n"
-            ])
-        else:
-            parts.extend([
-                f"--- FILE: {rel_path} ---",
-                "\n [preview unavailable] "
-                "\n"
-            ])
-    parts.append(instructions)
-    
-    print("\n\nSending request to Gemini for HTML spreadsheet generation...")
+    batches = prompts.plan_batches(uploaded_files, groups)
+    print(f"\n\nSending {len(batches)} request(s) to Gemini for HTML spreadsheet generation...")
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=parts,
-        )
-
-        html_rows = response.text.strip()
-        if html_rows.startswith('html') and html_rows.endswith(''):
-            html_rows = html_rows[7:-3].strip()
-        elif html_rows.startswith('') and html_rows.endswith(''):
-            lines = html_rows.split('\n')
-            if len(lines) > 2:
-                html_rows = '\n'.join(lines[1:-1])
-
-        with open("template.html", "r", encoding="utf-8") as f:
-            html_template = f.read()
-
-        complete_html = html_template.replace("{{TABLE_BODY}}", html_rows)
-        output_file = f"{repo_name}_components.html"
-        
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(complete_html)
-            
-        print(f"✅ HTML spreadsheet generated: {output_file}")
+        with tracing.span("analyze", batches=len(batches)) as s, ReportWriter(repo_name) as report:
+            print(f"Writing rows to {report.partial_file} as they arrive")
+            parsers = [ComponentParser(f"batch {i + 1}: ") for i in range(len(batches))]
+
+            def on_text(i, text):
+                for component in parsers[i].feed(text):
+                    # Ordered by batch in the final file
+                    report.write_row(component.cells(), (i, len(parsers[i].components)))
+
+            texts = prompts.generate_batches(batches, uploaded_files, repo_name, instructions, client,
+                                             cache=ResponseCache(), refresh=refresh, on_text=on_text,
+                                             journal=journal)
+            for i, parser in enumerate(parsers):
+                for component in parser.close():
+                    report.write_row(component.cells(), (i, len(parser.components)))
+            s.set(components=report.rows, rejected=sum(len(p.rejected) for p in parsers))
+            if None in texts:
+                # A partial table must not replace the last complete report
+                report.discard()
+        if None in texts:
+            print(f"⚠️ {texts.count(None)} of {len(texts)} batches failed, {report.output_file} was not updated")
+        else:
+            print(f"✅ HTML spreadsheet generated: {report.output_file} ({report.rows} rows)")
         
     except Exception as e:
         print(f"Error generating HTML spreadsheet: {e}")
+        return
+
+    if None in texts:
+        # Keep the stored job and the journal of the last run that got every answer
+        return None
+    components = [c for parser in parsers for c in parser.components]
+    if store is not None:
+        store.save_job(repo_name, components, folder)
+        print(f"Saved {len(components)} components of {repo_name} to {store.path}")
+    if journal is not None:
+        journal.finish()
+    return components
+
+def write_html_report(html_rows, repo_name, template_path="template.html"):
+    """Fill the template with the table rows and write <repo_name>_components.html."""
+    with ReportWriter(repo_name, template_path) as report:
+        parser = RowParser(report.columns)
+        for cells in parser.feed(html_rows):
+            report.write_row(cells)
+        parser.close()
+        
+    print(f"✅ HTML spreadsheet generated: {report.output_file}")
+    return report.output_file
+
+def write_job_report(store, repo_name, template_path="template.html", folder=None):
+    """Render <repo_name>_components.html from the components stored for the job of folder
+    (default: the newest job named repo_name)."""
+    components = store.job_components(repo_name, folder)
+    with ReportWriter(repo_name, template_path) as report:
+        for component in components:
+            report.write_row(component.cells())
+    print(f"✅ HTML spreadsheet generated: {report.output_file} ({report.rows} rows)")
+    return report.output_file
+
+def _collected(files, into):
+    """Pass files through, appending each to the list into."""
+    for item in files:
+        into.append(item)
+        yield item
+
+def process_folder(folder, client, converters=None, office=None, refresh=False, dwg=None):
+    """scan → convert → upload → group → analyze → HTML for one customer folder.
+    refresh asks the model again even when a cached answer exists.
+    Steps are journaled (see journal.py): after a crash, running the same
+    folder again resumes where the last run stopped.
+    Returns True when every batch was analyzed."""
+    repo_name = os.path.basename(os.path.abspath(folder))
+    output_dirs = (OUTPUT_IMAGES_DIR, OUTPUT_STL_DIR)
+    output_dirs += tuple(os.path.join(d, conversion.RENDER_WORK_DIR) for d in output_dirs)
+    with Journal(folder, output_dirs) as journal:
+        if journal.resuming:
+            removed = journal.cleanup()
+            print(f"Resuming the interrupted run of {repo_name}"
+                  + (f" ({removed} leftover file(s) removed)" if removed else ""))
+        with ExitStack() as stack:
+            if converters is None:
+                converters = stack.enter_context(conversion.conversion_pool())
+            # Conversions start while the scan is still running; the workers
+            # fingerprint each STEP first and render each geometry once
+            file_list = []
+            fingerprints = {}
+            uploaded_files = upload_files(_collected(iter_files(folder), file_list), client, converters,
+                                          office, dwg, journal, fingerprints)
+        groups, _ = grouping.group_files(file_list, fingerprints)
+        with ComponentStore() as store:
+            components = analyze_uploaded_files(uploaded_files, repo_name, client, groups, refresh,
+                                                store=store, folder=os.path.abspath(folder), journal=journal)
+        journal.report()
+    if hasattr(client, "stats"):
+        client.stats.report()
+    return components is not None
 
 if __name__ == "__main__":
     folder = input("Enter folder path to scan: ").strip()
@@ -199,10 +163,5 @@ if __name__ == "__main__":
     elif "GOOGLE_API_KEY" not in os.environ:
         print("Set GOOGLE_API_KEY in your environment variables.")
     else:
-        api_key = os.environ["GOOGLE_API_KEY"]
-        client = genai.Client(api_key=api_key)
-        
-        repo_name = os.path.basename(os.path.abspath(folder))
-        file_list = scan_files(folder)
-        uploaded_files = upload_files(file_list, client)
-        analyze_uploaded_files(uploaded_files, repo_name, client)
+        client = gemini.connect()
+        process_folder(folder, client)
@@ -0,0 +1,130 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import tracing
+
+# ---- CONFIG: on-disk cache location and size limit ----
+CACHE_DIR = os.environ.get("QUOTE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "quote_pipeline"))
+MAX_CACHE_BYTES = 2 * 1024 ** 3   # per cache, least recently used entries go first
+# -------------------------------------------------------
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """sha256 hex digest of a file's content."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ArtifactCache:
+    """
+    Content-addressed store of conversion outputs.
+    Each entry is a directory of named files, keyed by the source file's hash
+    plus the settings used to produce it. Entries are evicted least recently
+    used first once the cache grows past max_bytes. The cache size is
+    tracked as entries are stored, so the directory is only walked when
+    that estimate crosses max_bytes (other processes may have evicted
+    entries in the meantime).
+    """
+
+    def __init__(self, name, root=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.name = name
+        self.root = os.path.join(root, name)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None   # bytes in the cache as of the last walk plus what this instance stored since
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, path, settings):
+        """Cache key for a source file converted with the given settings dict."""
+        h = hashlib.sha256(file_digest(path).encode())
+        h.update(json.dumps(settings, sort_keys=True).encode())
+        return h.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key):
+        """Return the entry directory for key, or None on a miss."""
+        entry = self._entry_dir(key)
+        if not os.path.isdir(entry):
+            self.misses += 1
+            tracing.count("cache_misses", cache=self.name)
+            return None
+        os.utime(entry)  # mark as recently used
+        self.hits += 1
+        tracing.count("cache_hits", cache=self.name)
+        return entry
+
+    def delete(self, key):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def put(self, key, files):
+        """Store files ({name: src_path or bytes}) under key. Returns the entry directory."""
+        entry = self._entry_dir(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # Fill a scratch directory first so readers never see a half-written entry
+        tmp = tempfile.mkdtemp(dir=self.root, prefix=".tmp-")
+        added = 0
+        try:
+            for name, src in files.items():
+                if isinstance(src, bytes):
+                    with open(os.path.join(tmp, name), 'wb') as f:
+                        f.write(src)
+                    added += len(src)
+                else:
+                    shutil.copy2(src, os.path.join(tmp, name))
+                    added += os.path.getsize(src)
+            os.rename(tmp, entry)
+        except OSError:
+            # Another worker stored the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(entry):
+                raise
+            added = 0
+        with self._lock:
+            if self._size is not None:
+                self._size += added
+            walk = self._size is None or self._size > self.max_bytes
+        if walk:
+            self.evict()
+        return entry
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for shard in os.listdir(self.root):
+                shard_dir = os.path.join(self.root, shard)
+                if shard.startswith(".tmp-") or not os.path.isdir(shard_dir):
+                    continue
+                try:
+                    keys = os.listdir(shard_dir)
+                except FileNotFoundError:
+                    continue
+                for key in keys:
+                    entry = os.path.join(shard_dir, key)
+                    try:
+                        size = sum(e.stat().st_size for e in os.scandir(entry) if e.is_file())
+                        entries.append((os.path.getmtime(entry), size, entry))
+                    except FileNotFoundError:
+                        continue   # deleted by another thread or process mid-walk
+                    total += size
+            entries.sort()
+            for _, size, entry in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+            self._size = total
+
+    def report(self):
+        print(f"{self.name} cache: {self.hits} hits, {self.misses} misses")
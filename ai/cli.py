@@ -0,0 +1,210 @@
+"""
+Command line entry point for the quoting pipeline.
+
+    python ai/cli.py scan FOLDER [--changed-only] [--list file_list.txt]
+    python ai/cli.py convert FOLDER [--out DIR] [--workers N]
+    python ai/cli.py analyze FOLDER [--workers N] [--refresh] [--contact-sheets]
+    python ai/cli.py render-html [ROWS.html] --name NAME [--folder FOLDER]
+    python ai/cli.py search [--part PREFIX] [--material PREFIX]
+    python ai/cli.py import-html NAME_components.html
+    python ai/cli.py cleanup [--max-age-days N]
+
+cadquery, pyvista, pandas and google.genai are imported only when a file
+needs them, so scanning or a PDF-only folder never pays for CAD/VTK.
+--profile-startup prints how long startup and each heavy import took.
+--trace FILE / --metrics-port N record per-stage spans (see tracing.py).
+"""
+import time
+
+_STARTED = time.perf_counter()
+
+import os
+import argparse
+import lazy
+import tracing
+
+
+def cmd_scan(args):
+    from scanner import Manifest, iter_files, iter_changed_files, write_file_list
+
+    extensions = tuple(args.ext) if args.ext else None
+    if args.list:
+        write_file_list(args.folder, args.list, extensions or ('.stp', '.dwg', '.pdf', '.xlsx'))
+        return
+    if args.changed_only:
+        manifest = Manifest(args.folder)
+        for rel_path, _, _ in iter_changed_files(args.folder, manifest, extensions):
+            print(rel_path)
+        manifest.save()
+    else:
+        for rel_path, _, _ in iter_files(args.folder, extensions):
+            print(rel_path)
+
+
+def cmd_convert(args):
+    import bulk2
+    import conversion
+    from cache import ArtifactCache
+    from scanner import iter_files
+
+    png_dir = os.path.join(args.out, "generated_pngs") if args.out else bulk2.OUTPUT_IMAGES_DIR
+    stl_dir = os.path.join(args.out, "generated_stls") if args.out else bulk2.OUTPUT_STL_DIR
+    cache = None if args.no_cache else ArtifactCache("conversions")
+    conversions = conversion.iter_conversions(iter_files(args.folder), png_dir, stl_dir, cache,
+                                              convert_workers=args.workers)
+    for rel_path, converted in conversions:
+        if converted is None:
+            print(f"{rel_path}: skipped")
+            continue
+        path, mime_type, is_temp, _ = converted
+        if isinstance(path, bytes):
+            print(f"{rel_path}: {mime_type} in memory ({len(path)} bytes)")
+        elif is_temp:
+            os.unlink(path)
+            print(f"{rel_path}: converted to {mime_type}")
+        else:
+            print(f"{rel_path}: {path}")
+
+
+def cmd_analyze(args):
+    if "GOOGLE_API_KEY" not in os.environ:
+        raise SystemExit("Set GOOGLE_API_KEY in your environment variables.")
+    import bulk2
+    import conversion
+    import gemini
+    import sheets
+
+    if args.contact_sheets:
+        sheets.CONTACT_SHEETS = True
+    client = gemini.connect()
+    with conversion.conversion_pool(args.workers) as converters:
+        bulk2.process_folder(args.folder, client, converters, refresh=args.refresh)
+
+
+def cmd_render_html(args):
+    import bulk2
+    from components import ComponentStore
+
+    if args.rows is None:
+        with ComponentStore() as store:
+            folder = os.path.abspath(args.folder) if args.folder else None
+            bulk2.write_job_report(store, args.name, args.template, folder)
+        return
+    with open(args.rows, "r", encoding="utf-8") as f:
+        html_rows = f.read()
+    bulk2.write_html_report(html_rows, args.name, args.template)
+
+
+def cmd_search(args):
+    from components import ComponentStore
+
+    with ComponentStore() as store:
+        results = store.search(args.part, args.material, args.limit)
+    for job, c in results:
+        print(f"{job}\t{c.part_name}\t{c.material}\t{c.quantity}\t{c.finish}")
+    if not results:
+        print("No matching components.")
+
+
+def cmd_import_html(args):
+    from components import Component, ComponentStore
+    from report import RowParser
+
+    with open(args.report, "r", encoding="utf-8") as f:
+        text = f.read()
+    body = text.split("<tbody>", 1)[-1].split("</tbody>", 1)[0]
+    parser = RowParser(columns=4)
+    components = []
+    for cells in parser.feed(body):
+        try:
+            components.append(Component.from_cells(cells))
+        except ValueError as e:
+            print(f"skipped {cells}: {e}")
+    parser.close()
+    name = args.name or os.path.basename(args.report).rsplit("_components.html", 1)[0]
+    with ComponentStore() as store:
+        store.save_job(name, components)
+    print(f"Imported {len(components)} components as {name}")
+
+
+def cmd_cleanup(args):
+    import journal
+
+    removed = journal.cleanup(max_age=args.max_age_days * 24 * 3600)
+    print(f"cleanup: {removed} orphaned file(s) removed")
+
+
+def build_parser():
+    from conversion import CONVERT_WORKERS
+
+    parser = argparse.ArgumentParser(prog="cli.py", description="Customer folder → component quote pipeline")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print startup and heavy import timings")
+    parser.add_argument("--trace", metavar="FILE", help="append a JSON line per pipeline span to FILE")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port while running")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="list the files in a customer folder")
+    scan.add_argument("folder")
+    scan.add_argument("--ext", action="append", help="only this extension (repeatable), e.g. --ext .stp")
+    scan.add_argument("--changed-only", action="store_true", help="only files added or changed since the last scan")
+    scan.add_argument("--list", metavar="FILE", help="write relative paths to FILE (like parser.py)")
+    scan.set_defaults(func=cmd_scan)
+
+    convert = commands.add_parser("convert", help="convert files locally without uploading")
+    convert.add_argument("folder")
+    convert.add_argument("--out", help="output folder for PNG/STL (default: current directory)")
+    convert.add_argument("--workers", type=int, default=CONVERT_WORKERS)
+    convert.add_argument("--no-cache", action="store_true", help="ignore the conversion cache")
+    convert.set_defaults(func=cmd_convert)
+
+    analyze = commands.add_parser("analyze", help="convert, upload and analyze a folder, then write the HTML")
+    analyze.add_argument("folder")
+    analyze.add_argument("--workers", type=int, default=CONVERT_WORKERS)
+    analyze.add_argument("--refresh", action="store_true", help="ask the model again instead of using cached answers")
+    analyze.add_argument("--contact-sheets", action="store_true",
+                         help="upload STEP renders packed into tiled contact sheets (see sheets.py)")
+    analyze.set_defaults(func=cmd_analyze)
+
+    render_html = commands.add_parser("render-html", help="write <name>_components.html from saved rows or the store")
+    render_html.add_argument("rows", nargs="?", help="file holding the <tr> rows (default: job NAME in the store)")
+    render_html.add_argument("--name", required=True, help="project name used for the output file")
+    render_html.add_argument("--folder", help="analyzed folder of the job (default: the newest job named NAME)")
+    render_html.add_argument("--template", default="template.html")
+    render_html.set_defaults(func=cmd_render_html)
+
+    search = commands.add_parser("search", help="find components of past quotes")
+    search.add_argument("--part", help="part name prefix")
+    search.add_argument("--material", help="material prefix, e.g. AL6061")
+    search.add_argument("--limit", type=int, default=100)
+    search.set_defaults(func=cmd_search)
+
+    import_html = commands.add_parser("import-html", help="add an existing <name>_components.html to the store")
+    import_html.add_argument("report")
+    import_html.add_argument("--name", help="job name (default: taken from the file name)")
+    import_html.set_defaults(func=cmd_import_html)
+
+    cleanup = commands.add_parser("cleanup", help="remove what interrupted runs left behind (see journal.py)")
+    cleanup.add_argument("--max-age-days", type=float, default=7,
+                         help="unfinished jobs older than this are abandoned, not resumed")
+    cleanup.set_defaults(func=cmd_cleanup)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, "folder", None) is not None and not os.path.isdir(args.folder):
+        raise SystemExit(f"Invalid directory: {args.folder}")
+    if args.trace or args.metrics_port:
+        tracing.configure(args.trace, args.metrics_port)
+    elif tracing.METRICS_PORT:
+        tracing.serve_metrics()
+    if args.profile_startup:
+        print(f"startup: {time.perf_counter() - _STARTED:.3f}s to dispatch")
+    args.func(args)
+    if args.profile_startup:
+        lazy.report()
+
+
+if __name__ == "__main__":
+    main()
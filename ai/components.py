@@ -0,0 +1,239 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from dataclasses import dataclass, astuple
+
+# ---- CONFIG: quote history ----
+# Kept outside the cache directory: this is quote history, not a disposable artifact
+STORE_PATH = os.environ.get("QUOTE_STORE", os.path.join(os.path.expanduser("~"), ".local", "share",
+                                                         "quote_pipeline", "components.sqlite"))
+# -------------------------------
+
+SCHEMA_VERSION = 1   # 1: jobs keyed by folder instead of folder name
+
+# Keys the model is asked for, one JSON object per line
+JSON_FIELDS = ("part_name", "material", "quantity", "finish")
+
+JSON_INSTRUCTIONS = """
+        Output one JSON object per line (JSON Lines), one line per component, with exactly these keys:
+
+        {"part_name": "产品名称", "material": "材料", "quantity": 数量, "finish": "规格"}
+
+        - part_name: the STP filename without ".stp".
+        - material: e.g. "AL6061", "45", "SUS304", "POM".
+        - quantity: a whole number.
+        - finish: the surface finish (规格), "" if none.
+
+        Provide ONLY the JSON lines, no explanations, no array brackets, no other markup at all.
+"""
+
+_FENCE = re.compile(r"^\s*```[\w-]*\s*$")
+
+
+@dataclass(frozen=True)
+class Component:
+    """One manufactured part of a quote, as a row of template.html."""
+    part_name: str
+    material: str
+    quantity: int
+    finish: str
+
+    @classmethod
+    def from_json(cls, obj):
+        """Validate one decoded JSON row. Raises ValueError on anything unexpected."""
+        if not isinstance(obj, dict) or set(obj) != set(JSON_FIELDS):
+            raise ValueError(f"expected keys {', '.join(JSON_FIELDS)}")
+        quantity = obj["quantity"]
+        if isinstance(quantity, str) and quantity.strip().isdigit():
+            quantity = int(quantity)
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 1:
+            raise ValueError(f"quantity must be a positive whole number, got {quantity!r}")
+        text = {}
+        for key in ("part_name", "material", "finish"):
+            if not isinstance(obj[key], str):
+                raise ValueError(f"{key} must be a string")
+            text[key] = " ".join(obj[key].split())
+        if not text["part_name"]:
+            raise ValueError("part_name is empty")
+        return cls(text["part_name"], text["material"], quantity, text["finish"])
+
+    @classmethod
+    def from_cells(cls, cells):
+        """From the four cells of an old HTML report row (quantity like "4" or "4件")."""
+        name, material, quantity, finish = cells
+        digits = re.match(r"\s*(\d+)", quantity)
+        return cls.from_json({"part_name": name, "material": material,
+                              "quantity": int(digits.group(1)) if digits else 0, "finish": finish})
+
+    def cells(self):
+        return [self.part_name, self.material, str(self.quantity), self.finish]
+
+
+class ComponentParser:
+    """
+    Incremental parser for JSON Lines answers. feed() takes text as it
+    streams in and returns the Components completed so far; lines that are
+    not a valid component (other than blanks and code fences) are rejected.
+    """
+
+    def __init__(self, label=""):
+        self.label = label
+        self.components = []
+        self.rejected = []
+        self._buffer = ""
+
+    def feed(self, text):
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split("\n")
+        return [c for c in map(self._line, lines) if c is not None]
+
+    def close(self):
+        """End of the response: a last line without a newline still counts."""
+        rest = self.feed("\n")
+        if self.rejected:
+            print(f"⚠️ {self.label}rejected {len(self.rejected)} malformed row(s)")
+        return rest
+
+    def _line(self, line):
+        if not line.strip() or _FENCE.match(line):
+            return None
+        try:
+            component = Component.from_json(json.loads(line))
+        except ValueError as e:   # json.JSONDecodeError is a ValueError too
+            self.rejected.append(line.strip())
+            print(f"{self.label}rejected ({e}): {line.strip()[:120]!r}")
+            return None
+        self.components.append(component)
+        return component
+
+
+class ComponentStore:
+    """
+    Components of every analyzed job in one SQLite file, indexed by part
+    name and material so past quotes can be searched across all folders.
+    A job is keyed by its absolute folder path and replaced as a whole when
+    that folder is analyzed again; its name (the folder's basename) is for
+    display, so two folders with the same name are two jobs.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._migrate()
+        self._db.execute("PRAGMA foreign_keys=ON")
+        with self._db:
+            self._db.executescript(f"""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY,
+                    folder TEXT NOT NULL UNIQUE,
+                    name TEXT NOT NULL,
+                    analyzed REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_name ON jobs(name);
+                CREATE TABLE IF NOT EXISTS components (
+                    job_id INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+                    position INTEGER NOT NULL,
+                    part_name TEXT NOT NULL COLLATE NOCASE,
+                    material TEXT NOT NULL COLLATE NOCASE,
+                    quantity INTEGER NOT NULL,
+                    finish TEXT NOT NULL,
+                    PRIMARY KEY (job_id, position)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS components_part ON components(part_name);
+                CREATE INDEX IF NOT EXISTS components_material ON components(material);
+                PRAGMA user_version = {SCHEMA_VERSION};
+            """)
+
+    def _migrate(self):
+        """Bring a store written by an older version up to SCHEMA_VERSION (foreign keys must be off)."""
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version >= 1 or not self._db.execute("SELECT 1 FROM sqlite_master WHERE name = 'jobs'").fetchone():
+            return
+        # Version 0 keyed jobs by name; jobs saved without a folder keep their name as the key
+        self._db.executescript("""
+            BEGIN;
+            CREATE TABLE jobs_v1 (
+                id INTEGER PRIMARY KEY,
+                folder TEXT NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                analyzed REAL NOT NULL
+            );
+            INSERT OR REPLACE INTO jobs_v1 (id, folder, name, analyzed)
+                SELECT id, COALESCE(folder, name), name, analyzed FROM jobs ORDER BY analyzed;
+            DELETE FROM components WHERE job_id NOT IN (SELECT id FROM jobs_v1);
+            DROP TABLE jobs;
+            ALTER TABLE jobs_v1 RENAME TO jobs;
+            PRAGMA user_version = 1;
+            COMMIT;
+        """)
+
+    def save_job(self, name, components, folder=None):
+        """
+        Replace the components stored for the job of folder (an absolute
+        path; without one, name is the key too) and show it as name.
+        """
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM jobs WHERE folder = ?", (folder or name,))
+            job_id = self._db.execute("INSERT INTO jobs (folder, name, analyzed) VALUES (?, ?, ?)",
+                                      (folder or name, name, time.time())).lastrowid
+            self._db.executemany("INSERT INTO components VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(job_id, i) + astuple(c) for i, c in enumerate(components)])
+        return job_id
+
+    def job_components(self, name, folder=None):
+        """The components of the job of folder, else of the newest job named name."""
+        with self._lock:
+            rows = self._db.execute("""
+                SELECT c.part_name, c.material, c.quantity, c.finish
+                FROM components c
+                WHERE c.job_id = (SELECT id FROM jobs WHERE folder = ? OR (? IS NULL AND name = ?)
+                                  ORDER BY analyzed DESC LIMIT 1)
+                ORDER BY c.position""", (folder, folder, name)).fetchall()
+        return [Component(*row) for row in rows]
+
+    def jobs(self):
+        with self._lock:
+            return self._db.execute("SELECT name, folder, analyzed FROM jobs ORDER BY analyzed DESC").fetchall()
+
+    def search(self, part=None, material=None, limit=100):
+        """
+        (job name, Component) pairs whose part name / material start with
+        the given text (case-insensitive), newest jobs first.
+        """
+        where, args = [], []
+        # Prefix LIKE on a NOCASE column is answered from its index
+        if part:
+            where.append("c.part_name LIKE ? ESCAPE '\\'")
+            args.append(_like_prefix(part))
+        if material:
+            where.append("c.material LIKE ? ESCAPE '\\'")
+            args.append(_like_prefix(material))
+        sql = """
+            SELECT j.name, c.part_name, c.material, c.quantity, c.finish
+            FROM components c JOIN jobs j ON j.id = c.job_id"""
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY j.analyzed DESC, c.position LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(sql, args + [limit]).fetchall()
+        return [(row[0], Component(*row[1:])) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _like_prefix(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
@@ -0,0 +1,779 @@
+import io
+import os
+import json
+import hashlib
+import shutil
+import time
+import multiprocessing
+from contextlib import ExitStack
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import lazy
+import excel
+import tracing
+import assembly
+import drawings
+import grouping
+from cache import file_digest
+from office import OfficePool, OFFICE_EXTENSIONS
+from dwg import DwgPool, DWG_EXTENSIONS, settings as dwg_settings
+
+# ---- CONFIG: worker counts for the conversion stage ----
+CONVERT_WORKERS = os.cpu_count() or 1   # processes for STEP/Excel/PPTX conversion
+UPLOAD_WORKERS = 8                      # threads for client.files.upload
+# --------------------------------------------------------
+
+# ---- CONFIG: STEP render settings (part of the conversion cache key) ----
+STL_TOLERANCE = None           # mm; None picks it from the part size and WINDOW_SIZE
+STL_ANGULAR_TOLERANCE = 0.1
+PIXEL_TOLERANCE = 0.5          # chordal error allowed by the adaptive tolerance, in pixels
+MIN_TOLERANCE = 0.01           # mm; adaptive tolerance never goes finer than this
+MAX_RENDER_TRIANGLES = 300_000 # decimate meshes above this before rendering; None disables
+WINDOW_SIZE = (1920, 1080)
+RENDER_VIEWS = ("iso",)   # first view is the uploaded image; others: "top", "front", "side"
+SAVE_STL = True   # also keep an STL next to each render
+# -------------------------------------------------------------------------
+
+MIME_TYPES = {
+    '.pdf': 'application/pdf',
+    '.csv': 'text/csv',
+    '.png': 'image/png',
+}
+
+# Renders and STLs are written under this subfolder of png_dir/stl_dir with
+# a name unique to the source path, then copied to the friendly <stem>.png
+RENDER_WORK_DIR = ".renders"
+
+# Extensions that need a worker process before they can be uploaded
+CONVERTED_EXTENSIONS = ('.xls', '.xlsx', '.xlsm', '.stp')
+
+
+def render_settings():
+    """Settings that change the STL/PNG produced for a STEP file."""
+    return {
+        "tolerance": STL_TOLERANCE,
+        "angular_tolerance": STL_ANGULAR_TOLERANCE,
+        "pixel_tolerance": PIXEL_TOLERANCE,
+        "min_tolerance": MIN_TOLERANCE,
+        "max_render_triangles": MAX_RENDER_TRIANGLES,
+        "window_size": list(WINDOW_SIZE),
+        "views": list(RENDER_VIEWS),
+        "fingerprint": grouping.FINGERPRINT_VERSION,
+    }
+
+
+def stp_output_paths(stp_path, png_dir=None, stl_dir=None):
+    """(png_path, stl_path) for a STEP file; dirs default to generated_pngs/generated_stl next to it."""
+    folder = os.path.dirname(stp_path)
+    base_name = os.path.splitext(os.path.basename(stp_path))[0]
+    png_dir = png_dir or os.path.join(folder, "generated_pngs")
+    stl_dir = stl_dir or os.path.join(folder, "generated_stl")
+    return os.path.join(png_dir, base_name + ".png"), os.path.join(stl_dir, base_name + ".stl")
+
+
+def stp_work_paths(stp_path, png_dir=None, stl_dir=None):
+    """
+    (png_path, stl_path) a STEP file is rendered to: under RENDER_WORK_DIR,
+    named after the stem plus a hash of the absolute path, so parts with
+    the same file name in other folders or jobs never share a render.
+    """
+    png_path, stl_path = stp_output_paths(stp_path, png_dir, stl_dir)
+    suffix = "-" + hashlib.sha256(os.path.abspath(stp_path).encode("utf-8")).hexdigest()[:12]
+
+    def work(path):
+        stem, ext = os.path.splitext(os.path.basename(path))
+        return os.path.join(os.path.dirname(path), RENDER_WORK_DIR, stem + suffix + ext)
+
+    return work(png_path), work(stl_path)
+
+
+def view_image_paths(image_path, views=RENDER_VIEWS):
+    """dict view -> PNG path. The first view uses image_path, the rest get a _<view> suffix."""
+    stem, ext = os.path.splitext(image_path)
+    return {view: image_path if i == 0 else f"{stem}_{view}{ext}" for i, view in enumerate(views)}
+
+
+def stp_artifacts(stp_path, png_dir=None, stl_dir=None, work=True):
+    """
+    dict cache file name -> path for everything a STEP conversion produces:
+    the per-file work paths (see stp_work_paths), or with work=False the
+    friendly <stem>.png/<stem>.stl they are published to.
+    """
+    paths = stp_work_paths if work else stp_output_paths
+    png_path, stl_path = paths(stp_path, png_dir, stl_dir)
+    artifacts = {f"view_{view}.png": path for view, path in view_image_paths(png_path).items()}
+    artifacts["model.stl"] = stl_path
+    return artifacts
+
+
+def publish_stp(stp_path, png_dir=None, stl_dir=None):
+    """Copy a STEP file's renders/STL from its work paths to the friendly names (last one wins)."""
+    friendly = stp_artifacts(stp_path, png_dir, stl_dir, work=False)
+    for name, src in stp_artifacts(stp_path, png_dir, stl_dir).items():
+        if not os.path.isfile(src):
+            continue
+        dest = friendly[name]
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.{os.getpid()}.part"
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dest)
+
+
+def load_step_shape(stp_path):
+    """Import a STEP file as a single cadquery Shape."""
+    cq = lazy.load("cadquery")
+    shape_or_wp = cq.importers.importStep(stp_path)
+    # CadQuery returns either a Workplane or a plain Shape. Extract a Shape:
+    if isinstance(shape_or_wp, cq.Workplane):
+        solids = shape_or_wp.solids().vals() or shape_or_wp.vals()
+        return cq.Compound.makeCompound(solids)
+    return shape_or_wp
+
+
+def adaptive_tolerance(shape, window_size=WINDOW_SIZE):
+    """
+    Chordal tolerance (mm) matched to the render: the part is fitted to the
+    window, so one pixel covers about diagonal / shorter side of the window.
+    Finer facets than PIXEL_TOLERANCE of a pixel are invisible in the PNG.
+    """
+    mm_per_pixel = shape.BoundingBox().DiagonalLength / min(window_size)
+    return max(MIN_TOLERANCE, PIXEL_TOLERANCE * mm_per_pixel)
+
+
+def decimate(mesh, max_triangles=MAX_RENDER_TRIANGLES):
+    """Reduce mesh to about max_triangles with quadric decimation; small meshes pass through."""
+    if max_triangles is None or mesh.n_cells <= max_triangles:
+        return mesh
+    return mesh.decimate(1 - max_triangles / mesh.n_cells)
+
+
+def tessellate(shape, tolerance=0.1, angular_tolerance=STL_ANGULAR_TOLERANCE):
+    """Tessellate a Shape in memory. Returns (vertices (N, 3) float64, triangles (M, 3) int64)."""
+    np = lazy.load("numpy")
+    verts, tris = shape.tessellate(tolerance, angular_tolerance)
+    vertices = np.array([v.toTuple() for v in verts], dtype=np.float64).reshape(-1, 3)
+    triangles = np.array(tris, dtype=np.int64).reshape(-1, 3)
+    return vertices, triangles
+
+
+def to_polydata(vertices, triangles):
+    """Build a PyVista mesh from vertex/triangle arrays."""
+    np = lazy.load("numpy")
+    pv = lazy.load("pyvista")
+    # PyVista wants a flat array whose layout is: [3, i0, i1, i2,  3, i0, i1, i2, …]
+    faces = np.empty((len(triangles), 4), dtype=np.int64)
+    faces[:, 0] = 3
+    faces[:, 1:] = triangles
+    return pv.PolyData(vertices, faces.ravel())
+
+
+def write_binary_stl(stl_path, vertices, triangles):
+    """Write a binary STL straight from vertex/triangle arrays."""
+    with tracing.span("stl.write", triangles=len(triangles)) as s:
+        _write_binary_stl(stl_path, vertices, triangles)
+        s.set(bytes_out=os.path.getsize(stl_path))
+
+
+def _write_binary_stl(stl_path, vertices, triangles):
+    np = lazy.load("numpy")
+    corners = vertices[triangles].astype(np.float32)  # (M, 3, 3)
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+    records = np.zeros(len(triangles), dtype=[("normal", "<f4", 3), ("corners", "<f4", (3, 3)), ("attr", "<u2")])
+    records["normal"] = normals
+    records["corners"] = corners
+    tmp_path = stl_path + ".part"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * 80)
+        f.write(np.uint32(len(triangles)).tobytes())
+        f.write(records.tobytes())
+    os.replace(tmp_path, stl_path)
+
+
+def step_fingerprint(shape, stp_path):
+    """grouping.shape_fingerprint of a loaded STEP, or a hash of its bytes when that fails."""
+    try:
+        with tracing.span("step.fingerprint"):
+            return grouping.shape_fingerprint(shape)
+    except Exception as e:
+        print(f"Cannot fingerprint {os.path.basename(stp_path)}: {e}")
+        # Still groups byte-identical copies together
+        return "bytes:" + file_digest(stp_path)
+    finally:
+        assembly.release_mesh(shape)   # the coarse fingerprint mesh must not stand in for the render's
+
+
+def convert_stp_to_image(stp_path, output_image_path, stl_dir=None, save_stl=SAVE_STL, stl_path=None,
+                         claims=None, claim_as=None):
+    """
+    Convert STP file to PNG image by tessellating it in memory, one solid at
+    a time under the worker's memory cap (see assembly.py). The tolerance
+    follows the part size unless STL_TOLERANCE is set, and big meshes are
+    decimated before rendering. Every view in RENDER_VIEWS is
+    rendered by this process's long-lived renderer. If save_stl is set, the
+    STL is written to stl_path (default: <stem>.stl in stl_dir, itself
+    defaulting to generated_stl next to the STP) on a background thread
+    while the render runs.
+    The part is fingerprinted (see grouping.py) right after loading. With
+    claims (a dict shared between workers, fingerprint -> claim_as) a part
+    whose geometry another file already claimed is not rendered: the result
+    is just {"fingerprint": ..., "same_as": <that file's claim_as>}.
+    Returns a dict of mesh stats plus the "fingerprint", or None on failure.
+    """
+    from render import get_renderer
+
+    try:
+        with tracing.span("step.load", bytes_in=os.path.getsize(stp_path)):
+            shape = load_step_shape(stp_path)
+        fingerprint = step_fingerprint(shape, stp_path)
+        if claims is not None:
+            first = claims.setdefault(fingerprint, claim_as)
+            if first != claim_as:
+                print(f"Skipped render of {os.path.basename(stp_path)}: same geometry as {first}")
+                return {"fingerprint": fingerprint, "same_as": first}
+        start = time.perf_counter()
+        with tracing.span("step.tessellate") as s:
+            tolerance = STL_TOLERANCE or adaptive_tolerance(shape)
+            # Solid by solid, so assemblies stay under the worker's memory cap
+            vertices, triangles, mesh_info = assembly.tessellate_assembly(shape, tolerance, STL_ANGULAR_TOLERANCE)
+            s.set(triangles=len(triangles), tolerance=tolerance, **mesh_info)
+        tessellate_seconds = time.perf_counter() - start
+        del shape
+
+        stl_writer = None
+        if save_stl:
+            stl_path = stl_path or stp_output_paths(stp_path, stl_dir=stl_dir)[1]
+            os.makedirs(os.path.dirname(stl_path), exist_ok=True)
+            stl_writer = ThreadPoolExecutor(max_workers=1)
+            stl_done = stl_writer.submit(tracing.propagate(write_binary_stl), stl_path, vertices, triangles)
+
+        start = time.perf_counter()
+        with tracing.span("step.render", views=len(RENDER_VIEWS)) as s:
+            mesh = decimate(to_polydata(vertices, triangles))
+            get_renderer(WINDOW_SIZE).render(mesh, view_image_paths(output_image_path))
+            s.set(rendered_triangles=mesh.n_cells)
+        render_seconds = time.perf_counter() - start
+
+        if stl_writer is not None:
+            stl_done.result()
+            stl_writer.shutdown()
+        stats = {
+            "tolerance": tolerance,
+            "triangles": len(triangles),
+            "rendered_triangles": mesh.n_cells,
+            **mesh_info,
+            "tessellate_seconds": tessellate_seconds,
+            "render_seconds": render_seconds,
+            "fingerprint": fingerprint,
+        }
+        print(f"Mesh {os.path.basename(stp_path)}: tolerance {tolerance:.3f} mm, "
+              f"{stats['triangles']} -> {stats['rendered_triangles']} triangles")
+        return stats
+
+    except Exception as e:
+        print(f"Error converting STP to image: {e}")
+        return None
+
+
+def excel_to_csv(excel_path):
+    """
+    Every sheet of an Excel file as UTF-8 CSV bytes, built in memory.
+    .xlsx/.xlsm are streamed with openpyxl; legacy .xls still goes through pandas.
+    """
+    start = time.perf_counter()
+    with tracing.span("excel", bytes_in=os.path.getsize(excel_path)) as s:
+        if excel_path.lower().endswith('.xls'):
+            text = excel.pandas_workbook_to_csv(excel_path)
+        else:
+            text = excel.workbook_to_csv(excel_path)
+        data = text.encode('utf-8')
+        s.set(bytes_out=len(data))
+    return data, {"excel_seconds": time.perf_counter() - start, "csv_bytes": len(data)}
+
+
+def convert_file(abs_path, ext, png_dir=None, stl_dir=None, claims=None, rel_path=None):
+    """
+    Turn one customer file into something uploadable. Runs inside a worker process.
+    Returns (payload, mime_type, is_temp, info), or None if the type is not
+    supported. payload is a file path, or bytes for results built in memory;
+    is_temp marks paths to delete after upload. info is a dict of conversion
+    stats (mesh stats for STEP files).
+    png_dir/stl_dir default to generated_pngs/generated_stl next to the source file.
+    claims is passed on to convert_stp_to_image with rel_path as the claim;
+    a STEP that is not rendered because of it comes back with payload None
+    and info["same_as"] set.
+    With tracing on, the worker's spans travel back in info["spans"] (or in
+    the exception's .spans) for replay_spans in the parent.
+    """
+    if not tracing.ENABLED:
+        return _convert_file(abs_path, ext, png_dir, stl_dir, claims, rel_path)
+    with tracing.collected() as spans:
+        try:
+            with tracing.span("convert", ext=ext, bytes_in=os.path.getsize(abs_path)):
+                converted = _convert_file(abs_path, ext, png_dir, stl_dir, claims, rel_path)
+        except Exception as e:
+            e.spans = spans
+            raise
+    if converted is not None:
+        converted[3]["spans"] = spans
+    return converted
+
+
+def replay_spans(converted_or_error):
+    """Export the spans a worker attached to convert_file's result or exception."""
+    if isinstance(converted_or_error, BaseException):
+        tracing.replay(getattr(converted_or_error, "spans", None))
+    elif converted_or_error is not None:
+        tracing.replay(converted_or_error[3].pop("spans", None))
+
+
+def _convert_file(abs_path, ext, png_dir=None, stl_dir=None, claims=None, rel_path=None):
+    if ext == '.pdf':
+        if drawings.ENABLED:
+            try:
+                png, info = drawings.preprocess_pdf(abs_path)
+                info["pdf_bytes"] = os.path.getsize(abs_path)
+                return png, MIME_TYPES['.png'], False, info
+            except Exception as e:
+                print(f"PDF preprocessing failed for {abs_path} ({e}); uploading it as is")
+        return abs_path, MIME_TYPES['.pdf'], False, {}
+
+    elif ext in ('.xls', '.xlsx', '.xlsm'):
+        data, info = excel_to_csv(abs_path)
+        return data, MIME_TYPES['.csv'], False, info
+
+    elif ext == '.stp':
+        png_path, stl_path = stp_work_paths(abs_path, png_dir, stl_dir)
+        os.makedirs(os.path.dirname(png_path), exist_ok=True)
+        stats = convert_stp_to_image(abs_path, png_path, stl_path=stl_path, claims=claims, claim_as=rel_path)
+        if stats is None:
+            raise RuntimeError("STP conversion failed")
+        if "same_as" in stats:
+            return None, MIME_TYPES['.png'], False, stats
+        return png_path, MIME_TYPES['.png'], False, stats
+
+    return None
+
+
+def copy_stp(sources, abs_path, png_dir=None, stl_dir=None, info=None):
+    """
+    Copy renders/STL (sources: artifact name -> path) to where a fresh
+    conversion of abs_path would have put them, and publish them.
+    """
+    png_path, _ = stp_work_paths(abs_path, png_dir, stl_dir)
+    for name, dest in stp_artifacts(abs_path, png_dir, stl_dir).items():
+        if name not in sources or not os.path.isfile(sources[name]):
+            continue
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copy2(sources[name], dest)
+    publish_stp(abs_path, png_dir, stl_dir)
+    return png_path, MIME_TYPES['.png'], False, dict(info or {})
+
+
+def restore_cached_stp(entry, abs_path, png_dir=None, stl_dir=None):
+    """Copy cached renders/STL to where a fresh conversion would have put them, and publish them."""
+    info = {}
+    if os.path.isfile(os.path.join(entry, "fingerprint.txt")):
+        with open(os.path.join(entry, "fingerprint.txt"), "r") as f:
+            info["fingerprint"] = f.read()
+    sources = {name: os.path.join(entry, name) for name in os.listdir(entry)}
+    return copy_stp(sources, abs_path, png_dir, stl_dir, info)
+
+
+def restore_cached_drawing(entry):
+    """A PDF/DWG drawing's cached sheet image and text, as convert_file returns them."""
+    with open(os.path.join(entry, "drawing.png"), "rb") as f:
+        png = f.read()
+    with open(os.path.join(entry, "drawing.json"), "r", encoding="utf-8") as f:
+        info = json.load(f)
+    return png, MIME_TYPES['.png'], False, info
+
+
+def _upload(client, rel_path, converted, index=None):
+    payload, mime_type, is_temp, info = converted
+    in_memory = isinstance(payload, bytes)
+    try:
+        with tracing.span("upload", mime_type=mime_type) as s:
+            if index is not None:
+                digest = hashlib.sha256(payload).hexdigest() if in_memory else file_digest(payload)
+                obj = index.lookup(client, digest)
+                if obj is not None:
+                    s.set(reused=True)
+                    print(f"Reused upload {rel_path} ({obj.name})")
+                    return drawings.attach(obj, info)
+            if in_memory:
+                config = dict(mime_type=mime_type, display_name=os.path.basename(rel_path))
+                obj = client.files.upload(file=io.BytesIO(payload), config=config)
+            else:
+                obj = client.files.upload(file=payload, config=dict(mime_type=mime_type))
+            s.set(bytes_out=len(payload) if in_memory else os.path.getsize(payload))
+            if index is not None:
+                index.record(digest, obj)
+            print(f"Uploaded {rel_path} ({mime_type})")
+            return drawings.attach(obj, info)
+    finally:
+        if is_temp:
+            os.unlink(payload)
+
+
+def conversion_pool(workers=CONVERT_WORKERS):
+    """Process pool for convert_file. Long-running callers keep one and pass it to upload_files."""
+    # spawn instead of fork: OCCT and VTK do not survive a fork of an initialised parent
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _cache_drawing(cache, key, converted):
+    cache.put(key, {"drawing.png": converted[0],
+                    "drawing.json": json.dumps(converted[3], ensure_ascii=False).encode("utf-8")})
+
+
+def iter_conversions(file_list, png_dir=None, stl_dir=None, cache=None,
+                     converters=None, convert_workers=CONVERT_WORKERS, office=None, dwg=None,
+                     pdf_stems=None, dedupe_geometry=False):
+    """
+    Convert files in a process pool and yield (rel_path, converted) for every
+    file as its conversion finishes; converted is convert_file's tuple, or
+    None for unsupported types and failures. PDFs are preprocessed in the
+    pool too when drawings.ENABLED, otherwise passed through. STEP renders
+    and drawings found in cache (an ArtifactCache) are yielded right away.
+    file_list may be a generator (e.g. scanner.iter_files): work starts on
+    each file as soon as it is yielded. Pass converters (see conversion_pool)
+    to reuse warm worker processes; otherwise a pool is made for this call.
+    Office documents and DWG/DXF drawings are converted in OfficePool and
+    DwgPool batches once the file list is exhausted; pass office/dwg to
+    reuse pools. With a cache, a STEP file with the same bytes as one that
+    is already converting is not rendered again: it gets a copy of that
+    render once it is done. A DWG/DXF is skipped when the part also has a
+    PDF drawing; pdf_stems adds part stems whose PDF is not in file_list
+    (e.g. one a resumed run already uploaded). It is read once file_list
+    is exhausted. With dedupe_geometry, each STEP is fingerprinted in its
+    worker before rendering and only the first file of every geometry is
+    rendered; the others are yielded with payload None and info["same_as"]
+    naming that file.
+    """
+    cache_keys = {}
+    copies = {}        # cache key of a converting STEP -> [(rel_path, abs_path)] with the same bytes
+    office_jobs = {}   # abs_path -> rel_path
+    dwg_jobs = {}      # abs_path -> rel_path
+    step_jobs = {}     # rel_path -> abs_path of STEP files being rendered
+    claims = None      # fingerprint -> rel_path, shared with the workers (dedupe_geometry)
+    pdf_stems = set() if pdf_stems is None else pdf_stems
+    triangles = rendered_triangles = 0
+    pdf_bytes = drawing_bytes = 0
+    with ExitStack() as stack:
+        if converters is None:
+            converters = stack.enter_context(conversion_pool(convert_workers))
+        conversions = {}
+        for rel_path, abs_path, ext in file_list:
+            if ext == '.pdf':
+                pdf_stems.add(grouping.part_stem(rel_path))
+            if ext in OFFICE_EXTENSIONS:
+                office_jobs[abs_path] = rel_path
+            elif ext in DWG_EXTENSIONS:
+                dwg_jobs[abs_path] = rel_path   # decided once every PDF has been seen
+            elif ext == '.pdf' and not drawings.ENABLED:
+                # Nothing to convert
+                converted = convert_file(abs_path, ext)
+                replay_spans(converted)
+                yield rel_path, converted
+            elif ext in CONVERTED_EXTENSIONS or ext == '.pdf':
+                if ext == '.stp' and dedupe_geometry and claims is None:
+                    claims = stack.enter_context(multiprocessing.get_context("spawn").Manager()).dict()
+                if ext in ('.stp', '.pdf') and cache is not None:
+                    key = cache.key(abs_path, render_settings() if ext == '.stp' else drawings.settings())
+                    if key in copies:
+                        copies[key].append((rel_path, abs_path))
+                        continue
+                    entry = cache.get(key)
+                    if entry is not None:
+                        if ext == '.stp':
+                            converted = restore_cached_stp(entry, abs_path, png_dir, stl_dir)
+                            if claims is not None and "fingerprint" in converted[3]:
+                                claims.setdefault(converted[3]["fingerprint"], rel_path)
+                            yield rel_path, converted
+                        else:
+                            yield rel_path, restore_cached_drawing(entry)
+                        continue
+                    cache_keys[rel_path] = (key, abs_path, ext)
+                    if ext == '.stp':
+                        copies[key] = []
+                if ext == '.stp':
+                    future = converters.submit(convert_file, abs_path, ext, png_dir, stl_dir, claims, rel_path)
+                    step_jobs[rel_path] = abs_path
+                else:
+                    future = converters.submit(convert_file, abs_path, ext, png_dir, stl_dir)
+                conversions[future] = rel_path
+            else:
+                yield rel_path, None  # Not supported
+
+        if office_jobs:
+            if office is None:
+                office = stack.enter_context(OfficePool())
+            office_runner = stack.enter_context(ThreadPoolExecutor(max_workers=1))
+            conversions[office_runner.submit(office.convert, list(office_jobs))] = office_jobs
+
+        batch = []
+        unsupported = 0
+        for abs_path, rel_path in dwg_jobs.items():
+            ext = os.path.splitext(abs_path)[1].lower()
+            if grouping.part_stem(rel_path) in pdf_stems:
+                print(f"Skipped {rel_path}: the part has a PDF drawing")
+                yield rel_path, None
+                continue
+            if dwg is None:
+                dwg = stack.enter_context(DwgPool())
+            if not dwg.supports(ext):
+                unsupported += 1
+                yield rel_path, None
+                continue
+            if cache is not None:
+                key = cache.key(abs_path, dwg_settings())
+                entry = cache.get(key)
+                if entry is not None:
+                    yield rel_path, restore_cached_drawing(entry)
+                    continue
+                cache_keys[rel_path] = (key, abs_path, ext)
+            batch.append(abs_path)
+        if unsupported:
+            print(f"⚠️ {unsupported} drawing(s) not converted: install ezdxf (and ODA File Converter for DWG)")
+        if batch:
+            dwg_runner = stack.enter_context(ThreadPoolExecutor(max_workers=1))
+            conversions[dwg_runner.submit(dwg.convert, batch)] = dwg_jobs
+
+        for future in as_completed(conversions):
+            rel_path = conversions[future]
+            if isinstance(rel_path, dict):
+                # An office or drawing batch: one result per file
+                jobs = rel_path
+                for abs_path, result in future.result().items():
+                    rel_path = jobs[abs_path]
+                    if isinstance(result, Exception):
+                        print(f"Failed to process {rel_path}: {result}")
+                        yield rel_path, None
+                    elif jobs is office_jobs:
+                        yield rel_path, (result, MIME_TYPES['.pdf'], False, {})
+                    else:
+                        png, info = result
+                        converted = (png, MIME_TYPES['.png'], False, info)
+                        if rel_path in cache_keys:
+                            _cache_drawing(cache, cache_keys[rel_path][0], converted)
+                        yield rel_path, converted
+                continue
+            try:
+                converted = future.result()
+            except Exception as e:
+                replay_spans(e)
+                print(f"Failed to process {rel_path}: {e}")
+                yield rel_path, None
+                for copy_path, _ in copies.pop(cache_keys.get(rel_path, (None,))[0], ()):
+                    yield copy_path, None
+                continue
+            replay_spans(converted)
+            info = converted[3]
+            triangles += info.get("triangles", 0)
+            rendered_triangles += info.get("rendered_triangles", 0)
+            if "drawing_text" in info:
+                pdf_bytes += info["pdf_bytes"]
+                drawing_bytes += len(converted[0])
+            entry = None
+            if "same_as" in info:
+                # Not rendered: another file has this geometry. Byte copies are the same part too
+                yield rel_path, converted
+                for copy_path, _ in copies.pop(cache_keys[rel_path][0] if rel_path in cache_keys else None, ()):
+                    yield copy_path, (None, converted[1], False, dict(info))
+                continue
+            if rel_path in cache_keys:
+                key, abs_path, ext = cache_keys[rel_path]
+                if ext == '.stp' and assembly.degraded(info):
+                    # Coarsened or boxed under memory pressure: not kept, the next run meshes it afresh
+                    artifacts = stp_artifacts(abs_path, png_dir, stl_dir)
+                    for copy_path, copy_abs_path in copies.pop(key):
+                        yield copy_path, copy_stp(artifacts, copy_abs_path, png_dir, stl_dir, _mesh_info(info))
+                elif ext == '.stp':
+                    artifacts = stp_artifacts(abs_path, png_dir, stl_dir)
+                    files = {name: path for name, path in artifacts.items() if os.path.isfile(path)}
+                    files["fingerprint.txt"] = info["fingerprint"].encode()
+                    entry = cache.put(key, files)
+                elif "drawing_text" in info:   # a PDF that could not be preprocessed is not cached
+                    _cache_drawing(cache, key, converted)
+            if rel_path in step_jobs:
+                publish_stp(step_jobs[rel_path], png_dir, stl_dir)
+            yield rel_path, converted
+            if entry is not None:
+                for copy_path, copy_abs_path in copies.pop(key):
+                    yield copy_path, restore_cached_stp(entry, copy_abs_path, png_dir, stl_dir)
+
+    if triangles:
+        print(f"meshes: {triangles} triangles tessellated, {rendered_triangles} rendered")
+    if pdf_bytes:
+        print(f"drawings: {pdf_bytes / 1024:.0f} KB of PDF -> {drawing_bytes / 1024:.0f} KB of sheet images")
+    if cache is not None:
+        cache.report()
+
+
+def _mesh_info(info):
+    """What a byte copy of a STEP shares with its converted twin's info."""
+    return {k: info[k] for k in ("fingerprint", "coarsened", "boxed") if k in info}
+
+
+def _recorded(file_list, order, abs_paths, pdf_stems):
+    for item in file_list:
+        order.append(item[0])
+        abs_paths[item[0]] = item[1]
+        if item[2] == '.pdf':
+            pdf_stems.add(grouping.part_stem(item[0]))
+        yield item
+
+
+def _resumed(file_list, journal, client, uploads, converted, on_uploaded):
+    """
+    Pass on the files an interrupted run did not finish; the rest go to
+    uploads or converted. on_uploaded(rel_path, info) gets the recorded
+    conversion info of each upload picked up.
+    """
+    for item in file_list:
+        rel_path, abs_path, _ = item
+        obj = journal.uploaded_handle(client, rel_path, abs_path)
+        if obj is not None:
+            uploads[rel_path] = Future()
+            uploads[rel_path].set_result(obj)
+            on_uploaded(rel_path, journal.uploaded_info(rel_path))
+            continue
+        result = journal.converted_result(rel_path, abs_path)
+        if result is not None:
+            converted.append((rel_path, result))
+            continue
+        yield item
+
+
+def upload_files(file_list, client, png_dir=None, stl_dir=None, cache=None, index=None,
+                 converters=None, convert_workers=CONVERT_WORKERS, upload_workers=UPLOAD_WORKERS,
+                 office=None, dwg=None, contact_sheets=None, journal=None, fingerprints=None):
+    """
+    Uploads PDFs and DWG/DXF (as sheet image + text, see drawings.py and
+    dwg.py), Excels (as CSV), PPTX (as PDF), STP (as PNG).
+    Conversions run as in iter_conversions and each result is handed to the
+    upload thread pool as soon as it is ready. Files already in index (an
+    UploadIndex) reuse their live Gemini handle. With contact_sheets
+    (default: sheets.CONTACT_SHEETS) STEP renders are held back and
+    uploaded as a few tiled sheets once all conversions are done; each
+    sheet is drawn on the upload thread that sends it.
+    With journal (a journal.Journal) each conversion and upload is recorded
+    as it finishes, and files an interrupted run already converted or
+    uploaded are picked up from there. Renders packed on contact sheets are
+    journaled as converted only: their sheets are drawn again on resume.
+    STEPs meshed coarser or as boxes to stay under the memory cap (see
+    assembly.degraded) are neither journaled nor cached.
+    With fingerprints (a dict) the geometry fingerprint of every converted
+    STEP is stored in it by rel_path (see grouping.group_files), and a STEP
+    with the same geometry as one seen before is neither rendered nor
+    uploaded: it gets that file's handle.
+    Returns dict: rel_path -> file_obj (a sheets.Tile for packed renders)
+    or None, in file_list order.
+    """
+    import sheets
+
+    if contact_sheets is None:
+        contact_sheets = sheets.CONTACT_SHEETS
+    order = []
+    abs_paths = {}
+    pdf_stems = set()   # of every PDF in file_list, also those the journal already has
+    uploads = {}
+    resumed = []   # (rel_path, converted) picked up from the journal
+    renders = {}   # rel_path -> render path, for contact sheets
+    canonical = {}  # fingerprint -> first STEP with that geometry
+    same_as = {}    # rel_path of a STEP -> the STEP uploaded in its place
+    sheet_futures = []
+    sheet_seconds = []
+
+    def upload_sheet(number, page):
+        sheet = sheets.render_sheet(number, page)
+        start = time.perf_counter()
+        try:
+            return sheet, _upload(client, sheet.name, (sheet.data, sheet.mime_type, False, {}), index)
+        finally:
+            sheet_seconds.append(time.perf_counter() - start)
+
+    def upload(rel_path, converted):
+        obj = _upload(client, rel_path, converted, index)
+        if journal is not None and not assembly.degraded(converted[3]):
+            journal.record_uploaded(rel_path, abs_paths[rel_path], obj, converted[3])
+        return obj
+
+    def first_with_geometry(rel_path, info):
+        """The STEP seen before with the same geometry as rel_path, or None."""
+        if fingerprints is None or "fingerprint" not in info:
+            return None
+        fingerprints[rel_path] = info["fingerprint"]
+        first = canonical.setdefault(info["fingerprint"], rel_path)
+        return None if first == rel_path else first
+
+    def submit(rel_path, converted):
+        if "same_as" in converted[3]:
+            # Not rendered: the worker found the geometry already claimed
+            fingerprints[rel_path] = converted[3]["fingerprint"]
+            same_as[rel_path] = converted[3]["same_as"]
+            return
+        if rel_path.lower().endswith('.stp'):
+            first = first_with_geometry(rel_path, converted[3])
+            if first is not None:
+                same_as[rel_path] = first
+                return
+        if contact_sheets and rel_path.lower().endswith('.stp'):
+            renders[rel_path] = converted[0]
+        else:
+            uploads[rel_path] = uploaders.submit(upload, rel_path, converted)
+
+    with tracing.span("upload_files") as s, ThreadPoolExecutor(max_workers=upload_workers) as uploaders:
+        files = _recorded(file_list, order, abs_paths, pdf_stems)
+        if journal is not None:
+            files = _resumed(files, journal, client, uploads, resumed, first_with_geometry)
+        conversions = iter_conversions(files, png_dir, stl_dir, cache, converters, convert_workers, office, dwg,
+                                       pdf_stems, dedupe_geometry=fingerprints is not None)
+        for rel_path, converted in conversions:
+            if converted is None:
+                continue
+            if journal is not None and converted[0] is not None and not assembly.degraded(converted[3]):
+                abs_path = abs_paths[rel_path]
+                artifacts = ()
+                if rel_path.lower().endswith('.stp'):
+                    artifacts = stp_artifacts(abs_path, png_dir, stl_dir).values()
+                journal.record_converted(rel_path, abs_path, converted, artifacts)
+            submit(rel_path, converted)
+        for rel_path, converted in resumed:
+            submit(rel_path, converted)
+        # Sheets are drawn in parallel too, not one after another before the first upload
+        for number, page in enumerate(sheets.plan_sheets(renders), 1):
+            future = uploaders.submit(upload_sheet, number, page)
+            sheet_futures.append(future)
+            for rel_path, _ in page:
+                uploads[rel_path] = future
+        s.set(files=len(order))
+    built = [future.result()[0] for future in sheet_futures if not future.exception()]
+    if built:
+        sheets.report(built, sum(sheet_seconds))
+
+    if index is not None:
+        index.save()
+        index.report()
+
+    uploaded = {}
+    for rel_path in order:
+        future = uploads.get(rel_path)
+        if future is None:
+            uploaded[rel_path] = None  # Not supported or conversion failed
+            continue
+        try:
+            if rel_path in renders:
+                sheet, obj = future.result()
+                uploaded[rel_path] = sheets.Tile(obj, sheet, sheet.tiles[rel_path])
+            else:
+                uploaded[rel_path] = future.result()
+        except Exception as e:
+            print(f"Failed to process {rel_path}: {e}")
+            uploaded[rel_path] = None
+    for rel_path, first in same_as.items():
+        while first in same_as:
+            first = same_as[first]
+        uploaded[rel_path] = uploaded.get(first)
+    return uploaded
@@ -0,0 +1,205 @@
+"""
+Watch-folder service for the quoting pipeline.
+Every customer folder dropped into the inbox goes through
+scan → convert → upload → analyze → HTML, with cadquery/pyvista/genai
+imported once and the conversion workers (and their renderers) and
+LibreOffice profiles kept warm between jobs.
+
+    python ai/daemon.py /path/to/inbox
+
+Uses watchdog (inotify on Linux, FSEvents on macOS) when it is installed,
+and polls the inbox otherwise.
+"""
+import os
+import sys
+import time
+import queue
+import threading
+import bulk2
+import gemini
+import tracing
+import journal
+import conversion
+from office import OfficePool
+from dwg import DwgPool
+from scanner import Manifest, iter_files, iter_changed_files
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+
+# ---- CONFIG: daemon behaviour ----
+POLL_SECONDS = 5            # inbox rescan interval when watchdog is missing
+SETTLE_SECONDS = 10         # a folder must be quiet this long before it is queued
+MAX_CONCURRENT_JOBS = 2     # folders processed at the same time
+QUEUE_SIZE = 8              # queued folders before the watcher holds new ones back
+# ----------------------------------
+
+
+def folder_signature(folder):
+    """Cheap fingerprint of a folder's contents: (file count, total size, newest mtime)."""
+    count = size = newest = 0
+    for _, abs_path, _ in iter_files(folder):
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            continue
+        count += 1
+        size += st.st_size
+        newest = max(newest, st.st_mtime_ns)
+    return count, size, newest
+
+
+class FolderWatcher:
+    """
+    Tracks activity per top-level inbox folder and hands folders that have
+    settled to a bounded job queue drained by MAX_CONCURRENT_JOBS workers.
+    When the queue is full, settled folders stay pending (backpressure)
+    until a worker frees a slot.
+    """
+
+    def __init__(self, inbox, client, max_jobs=MAX_CONCURRENT_JOBS, queue_size=QUEUE_SIZE):
+        self.inbox = os.path.abspath(inbox)
+        self.client = client
+        self.max_jobs = max_jobs
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.converters = conversion.conversion_pool()
+        self.office = OfficePool()
+        self.dwg = DwgPool()
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = {}      # folder -> monotonic time of last activity
+        self._queued = set()
+        self._signatures = {}
+
+    def touch(self, path):
+        """Record activity somewhere under the inbox."""
+        rel = os.path.relpath(os.path.abspath(path), self.inbox)
+        if rel.startswith(os.pardir) or rel == os.curdir:
+            return
+        folder = os.path.join(self.inbox, rel.split(os.sep)[0])
+        if os.path.isdir(folder):
+            with self._lock:
+                self._pending[folder] = time.monotonic()
+
+    def poll(self):
+        """Fallback watcher: touch every folder whose signature changed since the last poll."""
+        for entry in os.scandir(self.inbox):
+            if not entry.is_dir():
+                continue
+            signature = folder_signature(entry.path)
+            if self._signatures.get(entry.path) != signature:
+                self._signatures[entry.path] = signature
+                self.touch(entry.path)
+
+    def schedule(self):
+        """Queue folders that have been quiet for SETTLE_SECONDS."""
+        now = time.monotonic()
+        with self._lock:
+            settled = [f for f, t in self._pending.items()
+                       if now - t >= SETTLE_SECONDS and f not in self._queued]
+        for folder in settled:
+            try:
+                self.jobs.put_nowait(folder)
+            except queue.Full:
+                return  # keep the rest pending until a worker frees a slot
+            with self._lock:
+                self._pending.pop(folder, None)
+                self._queued.add(folder)
+
+    def _work(self):
+        while not self.stop_event.is_set():
+            try:
+                folder = self.jobs.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self.run_job(folder)
+            except Exception as e:
+                print(f"Job failed for {folder}: {e}")
+            finally:
+                with self._lock:
+                    self._queued.discard(folder)
+                self.jobs.task_done()
+
+    def run_job(self, folder):
+        manifest = Manifest(folder)
+        changed = list(iter_changed_files(folder, manifest))
+        if not changed:
+            print(f"No changes in {folder}, skipping")
+            return
+        print(f"Processing {folder} ({len(changed)} new or changed files)")
+        started = time.perf_counter()
+        with tracing.span("job", folder=folder, files=len(changed)):
+            done = bulk2.process_folder(folder, self.client, self.converters, self.office, dwg=self.dwg)
+        if not done:
+            # Not marked as processed: the next change or restart retries it, resuming from the journal
+            print(f"Analysis of {folder} is incomplete after {time.perf_counter() - started:.1f}s, will retry")
+            return
+        manifest.save()
+        print(f"Finished {folder} in {time.perf_counter() - started:.1f}s")
+
+    def run(self):
+        workers = [threading.Thread(target=self._work, daemon=True) for _ in range(self.max_jobs)]
+        for w in workers:
+            w.start()
+
+        observer = None
+        if Observer is not None:
+            watcher = self
+
+            class Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    watcher.touch(event.src_path)
+
+            observer = Observer()
+            observer.schedule(Handler(), self.inbox, recursive=True)
+            observer.start()
+            print(f"Watching {self.inbox} (watchdog)")
+        else:
+            print(f"Watching {self.inbox} (polling every {POLL_SECONDS}s)")
+
+        removed = journal.cleanup()
+        if removed:
+            print(f"Removed {removed} file(s) left by interrupted runs")
+        # Pick up whatever is already in the inbox; the manifests skip finished folders
+        # and the journals resume interrupted ones
+        for entry in os.scandir(self.inbox):
+            if entry.is_dir():
+                self._pending[entry.path] = 0
+                self._signatures[entry.path] = folder_signature(entry.path)
+
+        last_poll = time.monotonic()
+        try:
+            while True:
+                if observer is None and time.monotonic() - last_poll >= POLL_SECONDS:
+                    self.poll()
+                    last_poll = time.monotonic()
+                self.schedule()
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("Stopping…")
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            self.stop_event.set()
+            for w in workers:
+                w.join()
+            self.converters.shutdown()
+            self.office.close()
+            self.dwg.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or not os.path.isdir(sys.argv[1]):
+        print("Usage: python ai/daemon.py <inbox folder>")
+    elif "GOOGLE_API_KEY" not in os.environ:
+        print("Set GOOGLE_API_KEY in your environment variables.")
+    else:
+        if tracing.METRICS_PORT:
+            tracing.serve_metrics()
+        client = gemini.connect()
+        FolderWatcher(sys.argv[1], client).run()
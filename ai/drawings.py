@@ -0,0 +1,179 @@
+"""
+PDF drawings as a compact title-block text plus a downscaled sheet image.
+
+Runs in the conversion workers. Text comes from the title block (bottom
+right of each sheet), from blocks holding a title-block keyword (material,
+finish, quantity, technical notes) and from small embedded tables. Only the
+pages with such text are rasterized (the first page if none has any), in
+grey at PDF_DPI and at most PDF_MAX_SIDE pixels on the long side.
+Needs PyMuPDF; without it PDFs are uploaded as they are.
+"""
+import io
+import os
+import re
+import importlib.util
+import lazy
+import tracing
+
+# ---- CONFIG: PDF drawing preprocessing (part of the conversion cache key) ----
+PDF_PREPROCESS = True
+PDF_DPI = 150
+PDF_MAX_SIDE = 1536      # px on the long side of each rendered page
+PDF_MAX_PAGES = 2        # pages rasterized per drawing
+PDF_GRAY_LEVELS = 16     # palette size of the PNG; None keeps full 8-bit grey
+PDF_TEXT_CHARS = 3000    # extracted text kept per drawing
+TITLE_BLOCK = (0.35, 0.75)   # title block: right of this width and below this height fraction
+# -------------------------------------------------------------------------------
+
+KEYWORDS = ("材料", "材质", "数量", "表面处理", "热处理", "规格", "名称", "图号", "重量", "技术要求", "备注",
+            "MATERIAL", "QTY", "QUANTITY", "FINISH", "TREATMENT", "PART NAME", "PART NO", "DWG NO", "WEIGHT")
+KEYWORD_PATTERN = re.compile("|".join(map(re.escape, KEYWORDS)), re.I)
+_WORD = re.compile(r"[^\W\d_]{2,}")   # two letters or CJK characters: not a bare dimension
+
+ENABLED = PDF_PREPROCESS and any(importlib.util.find_spec(m) for m in ("pymupdf", "fitz"))
+
+
+def settings():
+    """Settings that change the text/image produced for a PDF."""
+    return {
+        "dpi": PDF_DPI,
+        "max_side": PDF_MAX_SIDE,
+        "max_pages": PDF_MAX_PAGES,
+        "gray_levels": PDF_GRAY_LEVELS,
+        "text_chars": PDF_TEXT_CHARS,
+        "title_block": list(TITLE_BLOCK),
+        "keywords": list(KEYWORDS),
+    }
+
+
+def _pymupdf():
+    try:
+        return lazy.load("pymupdf")
+    except ImportError:
+        return lazy.load("fitz")   # PyMuPDF before 1.24
+
+
+class Drawing:
+    """An uploaded sheet image together with the text pulled out of its PDF."""
+
+    def __init__(self, file, text, width, height):
+        self.file = file
+        self.text = text
+        self.width = width
+        self.height = height
+
+    def __getattr__(self, name):
+        if name == "file":   # not set yet (copy, unpickling)
+            raise AttributeError(name)
+        return getattr(self.file, name)
+
+
+def attach(file_obj, info):
+    """Wrap an uploaded sheet image as a Drawing when info came from preprocess_pdf."""
+    if "drawing_text" not in info:
+        return file_obj
+    return Drawing(file_obj, info["drawing_text"], info["width"], info["height"])
+
+
+def _page_text(page):
+    """(title block lines, other keyword lines) of one page."""
+    width, height = page.rect.width, page.rect.height
+    title, notes = [], []
+    for x0, y0, x1, y1, text, _, kind in page.get_text("blocks"):
+        if kind != 0:
+            continue
+        lines = [" ".join(line.split()) for line in text.splitlines()]
+        lines = [line for line in lines if line]
+        if not lines:
+            continue
+        if x0 >= TITLE_BLOCK[0] * width and y0 >= TITLE_BLOCK[1] * height:
+            title.extend(lines)
+        elif KEYWORD_PATTERN.search(text):
+            notes.extend(lines)
+    return title, notes
+
+
+def _page_tables(page):
+    """Rows of the small tables on a page (BOMs, revision blocks); the sheet frame is skipped."""
+    if not hasattr(page, "find_tables"):   # PyMuPDF before 1.23
+        return []
+    area = page.rect.width * page.rect.height
+    rows = []
+    for table in page.find_tables().tables:
+        x0, y0, x1, y1 = table.bbox
+        if (x1 - x0) * (y1 - y0) > area / 2:
+            continue
+        for row in table.extract():
+            cells = [" ".join(cell.split()) for cell in row if cell and cell.strip()]
+            # Dimension clusters also come out as "tables"; keep rows with words in them
+            if len(cells) >= 2 and any(_WORD.search(cell) for cell in cells):
+                rows.append(" | ".join(cells))
+    return rows
+
+
+def _render(pymupdf, pages):
+    """PNG bytes of the pages stacked vertically, plus the image size."""
+    Image = lazy.load("PIL.Image")
+    images = []
+    for page in pages:
+        zoom = min(PDF_DPI / 72, PDF_MAX_SIDE / max(page.rect.width, page.rect.height))
+        pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), colorspace=pymupdf.csGRAY, alpha=False)
+        images.append(Image.frombytes("L", (pix.width, pix.height), pix.samples))
+    width = max(im.width for im in images)
+    sheet = Image.new("L", (width, sum(im.height for im in images)), 255)
+    y = 0
+    for im in images:
+        sheet.paste(im, (0, y))
+        y += im.height
+    return encode_sheet(sheet), sheet.width, sheet.height
+
+
+def encode_sheet(image):
+    """PNG bytes of a grey ("L") sheet image, palettized to PDF_GRAY_LEVELS."""
+    if PDF_GRAY_LEVELS:
+        # Line drawings need few grey levels; a small palette compresses far better
+        image = image.quantize(PDF_GRAY_LEVELS)
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def _dedupe(lines):
+    return list(dict.fromkeys(lines))
+
+
+def preprocess_pdf(pdf_path):
+    """
+    (png_bytes, info) for a drawing PDF; info["drawing_text"] holds the
+    extracted text and the rest are stats. Raises on unreadable PDFs.
+    """
+    pymupdf = _pymupdf()
+    with tracing.span("pdf", bytes_in=os.path.getsize(pdf_path)) as s, pymupdf.open(pdf_path) as doc:
+        title, notes, tables, relevant = [], [], [], []
+        for page in doc:
+            page_title, page_notes = _page_text(page)
+            page_tables = _page_tables(page)
+            if any(KEYWORD_PATTERN.search(line) for line in page_title + page_notes):
+                relevant.append(page)
+            title += page_title
+            notes += page_notes
+            tables += page_tables
+        pages = relevant[:PDF_MAX_PAGES] or [doc[0]]
+
+        sections = []
+        for heading, lines in (("title block", title), ("notes", notes), ("tables", tables)):
+            lines = _dedupe(lines)
+            if lines:
+                sections.append(f"[{heading}]\n" + "\n".join(lines))
+        text = "\n".join(sections)[:PDF_TEXT_CHARS]
+
+        png, width, height = _render(pymupdf, pages)
+        info = {
+            "drawing_text": text,
+            "pages": doc.page_count,
+            "rendered_pages": [page.number + 1 for page in pages],
+            "width": width,
+            "height": height,
+        }
+        s.set(pages=doc.page_count, bytes_out=len(png))
+    return png, info
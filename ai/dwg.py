@@ -0,0 +1,225 @@
+"""
+DWG/DXF drawings as a sheet image plus their dimension and annotation text.
+
+DwgPool hands drawings in batches to a few converter processes, the way
+OfficePool does for LibreOffice. The converter is this file run as a
+script: DWG files of a batch go through one ODA File Converter run to DXF,
+then ezdxf renders each DXF to a grey PNG and collects its text (title
+block attributes, TEXT/MTEXT notes, dimension values). fakes.FAKE_DWG is a
+stand-in command for machines without ODA/ezdxf.
+
+    python dwg.py --outdir OUT --scratch DIR FILE...   writes OUT/<stem>.png and OUT/<stem>.json
+"""
+import io
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+import importlib.util
+import lazy
+import drawings
+from office import OfficePool
+
+# ---- CONFIG: DWG/DXF conversion (part of the conversion cache key) ----
+ODA_COMMAND = [shutil.which("ODAFileConverter") or "ODAFileConverter"]
+if shutil.which("xvfb-run"):
+    ODA_COMMAND = ["xvfb-run", "-a"] + ODA_COMMAND   # the converter is a Qt app and wants a display
+DWG_COMMAND = [sys.executable, os.path.abspath(__file__)]
+DWG_INSTANCES = 2         # converter processes running at the same time
+DWG_TIMEOUT = 120         # seconds per drawing before a converter is killed
+DWG_DPI = 150
+DWG_MAX_SIDE = 1536       # px on the long side of the sheet image
+DWG_TEXT_CHARS = 3000     # extracted text kept per drawing
+# ------------------------------------------------------------------------
+
+DWG_EXTENSIONS = ('.dwg', '.dxf')
+
+_DIMENSION_KINDS = {3: "Ø{}", 4: "R{}", 2: "{}°", 5: "{}°"}   # diameter, radius, angular
+
+
+def settings():
+    """Settings that change the image/text produced for a drawing."""
+    return {"dpi": DWG_DPI, "max_side": DWG_MAX_SIDE, "text_chars": DWG_TEXT_CHARS,
+            "gray_levels": drawings.PDF_GRAY_LEVELS}
+
+
+class DwgPool(OfficePool):
+    """
+    Converts DWG/DXF drawings with a few converter processes, in batches,
+    with OfficePool's timeouts and one-at-a-time retries. convert() returns
+    dict path -> (png bytes, info), or an exception per failed drawing.
+    """
+
+    TOOL = "DWG converter"
+    SPAN = "dwg.run"
+
+    def __init__(self, instances=DWG_INSTANCES, timeout=DWG_TIMEOUT, command=None):
+        super().__init__(instances, timeout, command or DWG_COMMAND)
+
+    def supports(self, ext):
+        """False when the real converter is missing what it needs for ext."""
+        if self.command != DWG_COMMAND:
+            return True
+        if importlib.util.find_spec("ezdxf") is None:
+            return False
+        return ext == ".dxf" or shutil.which(ODA_COMMAND[-1]) is not None
+
+    def _command(self, slot, paths, fmt, outdir):
+        # The per-slot profile directory doubles as scratch space for the DXF files
+        return self.command + ["--outdir", outdir, "--scratch", self._profiles[slot]] + list(paths)
+
+    def _read_output(self, outdir, path, fmt):
+        stem = os.path.join(outdir, os.path.splitext(os.path.basename(path))[0])
+        if not (os.path.isfile(stem + ".png") and os.path.isfile(stem + ".json")):
+            return None
+        with open(stem + ".png", "rb") as f:
+            png = f.read()
+        with open(stem + ".json", "r", encoding="utf-8") as f:
+            return png, json.load(f)
+
+    def convert(self, paths, fmt="png"):
+        return super().convert(paths, fmt)
+
+
+# ---- the converter process ----
+
+def dwg_to_dxf(paths, workdir):
+    """Convert DWG files with one ODA File Converter run. Returns dict path -> DXF path for those it wrote."""
+    indir = os.path.join(workdir, "dwg")
+    outdir = os.path.join(workdir, "dxf")
+    os.makedirs(indir)
+    os.makedirs(outdir)
+    # ODA converts whole folders, so the batch gets one of its own
+    for path in paths:
+        try:
+            shutil.copyfile(path, os.path.join(indir, os.path.basename(path)))
+        except OSError as e:
+            print(f"{path}: {e}", file=sys.stderr)
+    subprocess.run(ODA_COMMAND + [indir, outdir, "ACAD2018", "DXF", "0", "1", "*.DWG;*.dwg"],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    dxf_paths = {}
+    for path in paths:
+        dxf = os.path.join(outdir, os.path.splitext(os.path.basename(path))[0] + ".dxf")
+        if os.path.isfile(dxf):
+            dxf_paths[path] = dxf
+    return dxf_paths
+
+
+def _dimension_text(dim):
+    try:
+        measured = dim.get_measurement()
+    except Exception:   # ezdxf cannot measure every dimension type
+        measured = None
+    if isinstance(measured, (int, float)):
+        kind = dim.dimtype & 7
+        value = f"{measured:.3f}".rstrip("0").rstrip(".")
+        measured = _DIMENSION_KINDS.get(kind, "{}").format(value)
+    else:
+        measured = ""
+    override = (dim.dxf.get("text") or "").strip()
+    if override and override != "<>":
+        return " ".join(override.replace("<>", measured).replace("\\P", " ").split())
+    return measured
+
+
+def drawing_text(doc):
+    """(text, counts) of a DXF document: title block attributes, keyword text, notes and dimensions."""
+    title, notes, dimensions = [], [], []
+    for layout in doc.layouts:
+        for insert in layout.query("INSERT"):
+            for attrib in insert.attribs:
+                value = " ".join(attrib.dxf.text.split())
+                if value:
+                    title.append(f"{attrib.dxf.tag}: {value}")
+        for entity in layout.query("TEXT MTEXT"):
+            for line in entity.plain_text().splitlines():
+                line = " ".join(line.split())
+                if line:
+                    (title if drawings.KEYWORD_PATTERN.search(line) else notes).append(line)
+        for dim in layout.query("DIMENSION"):
+            value = _dimension_text(dim)
+            if value:
+                dimensions.append(value)
+
+    sections = []
+    for heading, lines, sep in (("title block", title, "\n"), ("notes", notes, "\n"),
+                                ("dimensions", dimensions, ", ")):
+        lines = list(dict.fromkeys(lines))
+        if lines:
+            sections.append(f"[{heading}]\n" + sep.join(lines))
+    counts = {"annotations": len(title) + len(notes), "dimensions": len(dimensions)}
+    return "\n".join(sections)[:DWG_TEXT_CHARS], counts
+
+
+def render(doc):
+    """(png bytes, width, height) of the model space on a white sheet."""
+    matplotlib = lazy.load("matplotlib")
+    matplotlib.use("Agg")
+    plt = lazy.load("matplotlib.pyplot")
+    Image = lazy.load("PIL.Image")
+    drawing = lazy.load("ezdxf.addons.drawing")
+    backend = lazy.load("ezdxf.addons.drawing.matplotlib")
+
+    fig = plt.figure()
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    frontend_args = {}
+    if importlib.util.find_spec("ezdxf.addons.drawing.config"):   # ezdxf 1.0+
+        config = lazy.load("ezdxf.addons.drawing.config")
+        frontend_args["config"] = config.Configuration(background_policy=config.BackgroundPolicy.WHITE,
+                                                       color_policy=config.ColorPolicy.BLACK)
+    drawing.Frontend(drawing.RenderContext(doc), backend.MatplotlibBackend(ax),
+                     **frontend_args).draw_layout(doc.modelspace(), finalize=True)
+    (x0, x1), (y0, y1) = ax.get_xlim(), ax.get_ylim()
+    scale = DWG_MAX_SIDE / max(x1 - x0, y1 - y0, 1e-9)
+    fig.set_size_inches(max(1, (x1 - x0) * scale) / DWG_DPI, max(1, (y1 - y0) * scale) / DWG_DPI)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=DWG_DPI, facecolor="white")
+    plt.close(fig)
+    image = Image.open(buffer).convert("L")
+    return drawings.encode_sheet(image), image.width, image.height
+
+
+def convert_drawing(dxf_path, outdir, stem):
+    recover = lazy.load("ezdxf.recover")
+    doc, _ = recover.readfile(dxf_path)   # tolerates the damage common in exported DWGs
+    text, counts = drawing_text(doc)
+    png, width, height = render(doc)
+    info = {"drawing_text": text, "width": width, "height": height, **counts}
+    with open(os.path.join(outdir, stem + ".png"), "wb") as f:
+        f.write(png)
+    # The JSON goes last: the pool only takes a drawing whose .json exists
+    with open(os.path.join(outdir, stem + ".json"), "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a batch of DWG/DXF drawings (run by DwgPool).")
+    parser.add_argument("--outdir", required=True)
+    parser.add_argument("--scratch", default=tempfile.gettempdir())
+    parser.add_argument("paths", nargs="+")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="batch_", dir=args.scratch)
+    try:
+        dwgs = [p for p in args.paths if p.lower().endswith(".dwg")]
+        dxf_paths = dwg_to_dxf(dwgs, workdir) if dwgs else {}
+        for path in args.paths:
+            dxf = path if path.lower().endswith(".dxf") else dxf_paths.get(path)
+            if dxf is None:
+                print(f"{path}: ODA File Converter wrote no DXF", file=sys.stderr)
+                continue
+            try:
+                convert_drawing(dxf, args.outdir, os.path.splitext(os.path.basename(path))[0])
+            except Exception as e:
+                print(f"{path}: {e}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
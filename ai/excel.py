@@ -0,0 +1,68 @@
+import io
+import csv
+import datetime
+import lazy
+
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value).strip()
+
+
+def iter_sheet_rows(sheet, trim=True):
+    """Yield each row of a read-only worksheet as a list of strings, dropping empty rows if trim."""
+    for row in sheet.iter_rows(values_only=True):
+        cells = [_cell_text(v) for v in row]
+        if trim:
+            while cells and not cells[-1]:
+                cells.pop()
+            if not cells:
+                continue
+        yield cells
+
+
+def workbook_to_csv(excel_path, trim=True):
+    """
+    Convert every sheet of an .xlsx/.xlsm workbook to CSV text in memory.
+    The workbook is streamed read-only, so only one sheet is held at a time.
+    With trim, empty rows, trailing empty cells and all-empty columns are
+    dropped. Sheets are separated by a "# sheet: <name>" line.
+    """
+    openpyxl = lazy.load("openpyxl")
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    workbook = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = list(iter_sheet_rows(sheet, trim))
+            if trim and not rows:
+                continue
+            if trim:
+                width = max(len(r) for r in rows)
+                used = [i for i in range(width) if any(i < len(r) and r[i] for r in rows)]
+                rows = [[r[i] if i < len(r) else "" for i in used] for r in rows]
+            if len(workbook.worksheets) > 1:
+                out.write(f"# sheet: {sheet.title}\n")
+            writer.writerows(rows)
+            out.write("\n")
+    finally:
+        workbook.close()
+    return out.getvalue()
+
+
+def pandas_workbook_to_csv(excel_path):
+    """The old path: every sheet through a pandas DataFrame. Kept for .xls and for comparison."""
+    pd = lazy.load("pandas")
+    sheets = pd.read_excel(excel_path, sheet_name=None)
+    out = io.StringIO()
+    for name, df in sheets.items():
+        if len(sheets) > 1:
+            out.write(f"# sheet: {name}\n")
+        df.to_csv(out, index=False)
+        out.write("\n")
+    return out.getvalue()
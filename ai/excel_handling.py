@@ -1,10 +1,9 @@
-import pandas as pd
+from excel import workbook_to_csv
 
 def excel_to_csv(excel_path, csv_path):
-    # Read the first sheet of the Excel file
-    df = pd.read_excel(excel_path)
-    # Write to CSV
-    df.to_csv(csv_path, index=False)
+    # Stream every sheet of the Excel file straight to CSV (no DataFrame)
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(workbook_to_csv(excel_path))
 
 # Example usage
-excel_to_csv('/Users/hashashin/Downloads/吉利30度载具0625/吉利30度图纸+BOM/载具30BOM-1-13-16.xlsx', 'output.csv')
\ No newline at end of file
+excel_to_csv('/Users/hashashin/Downloads/吉利30度载具0625/吉利30度图纸+BOM/载具30BOM-1-13-16.xlsx', 'output.csv')
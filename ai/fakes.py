@@ -0,0 +1,286 @@
+"""
+Offline stand-ins for the parts of google.genai the pipeline uses.
+Pass FakeClient() wherever a genai.Client is expected to run the
+pipeline without network access or an API key.
+
+Run as a script, it also stands in for external converters:
+    OfficePool(command=FAKE_SOFFICE)
+    DwgPool(command=FAKE_DWG)
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import base64
+import hashlib
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+import lazy
+
+# Prompt labels written by prompts.build_contents
+_COMPONENT = re.compile(r"=== COMPONENT: (.*?)(?: \(same part as: (.*)\))? ===$")
+_FILE = re.compile(r"--- FILE: (.*?)(?: \(.*\))? ---$")
+
+
+class FakeAPIError(Exception):
+    """Shaped like google.genai.errors.APIError: carries the HTTP status in .code."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def transport_error():
+    """A dropped connection as the SDK's httpx transport raises it (ConnectionResetError without httpx)."""
+    try:
+        httpx = lazy.load("httpx")
+    except ImportError:
+        return ConnectionResetError("connection reset by peer")
+    return httpx.ReadError("[Errno 104] Connection reset by peer")
+
+
+def maybe_fail(failure_rate):
+    """Raise a transient API error with probability failure_rate."""
+    if failure_rate and random.random() < failure_rate:
+        raise random.choice([FakeAPIError(429, "RESOURCE_EXHAUSTED"),
+                             FakeAPIError(503, "UNAVAILABLE"),
+                             transport_error()])
+
+
+class FakeFile:
+    def __init__(self, name, mime_type, size_bytes, expiration_time):
+        self.name = name
+        self.uri = f"https://fake.local/v1beta/{name}"
+        self.mime_type = mime_type
+        self.size_bytes = size_bytes
+        self.expiration_time = expiration_time
+        self.state = "ACTIVE"
+        self.sha256_hash = None
+
+    def __repr__(self):
+        return f"FakeFile({self.name!r}, {self.mime_type!r})"
+
+
+class FakeFiles:
+    """Mimics client.files: upload/get/delete/list, with files expiring after ttl.
+    failure_rate is the chance each upload fails with a transient error.
+    latency and bytes_per_second make each upload take as long as a real one would;
+    concurrent uploads share the bytes_per_second like they share a real uplink."""
+
+    def __init__(self, ttl=timedelta(hours=48), failure_rate=0.0, latency=0.0, bytes_per_second=None):
+        self.ttl = ttl
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.upload_count = 0
+        self.uploaded_bytes = 0
+        self._files = {}
+        self._lock = threading.Lock()
+        self._link_free_at = 0.0   # perf_counter time the simulated uplink is done sending
+
+    def _transfer(self, size):
+        """Sleep for the request latency, then for this upload's turn on the shared uplink."""
+        done = time.perf_counter() + self.latency
+        if self.bytes_per_second:
+            with self._lock:
+                done = max(done, self._link_free_at) + size / self.bytes_per_second
+                self._link_free_at = done
+        time.sleep(max(0.0, done - time.perf_counter()))
+
+    def upload(self, file, config=None):
+        mime_type = (config or {}).get("mime_type", "application/octet-stream")
+        if hasattr(file, "read"):
+            data = file.read()
+        else:
+            with open(file, "rb") as f:
+                data = f.read()
+        size = len(data)
+        if self.latency or self.bytes_per_second:
+            self._transfer(size)
+        maybe_fail(self.failure_rate)
+        obj = FakeFile(f"files/{uuid.uuid4().hex[:12]}", mime_type, size,
+                       datetime.now(timezone.utc) + self.ttl)
+        obj.sha256_hash = base64.b64encode(hashlib.sha256(data).digest()).decode()
+        with self._lock:
+            self._files[obj.name] = obj
+            self.upload_count += 1
+            self.uploaded_bytes += size
+        return obj
+
+    def get(self, name):
+        with self._lock:
+            obj = self._files.get(name)
+        if obj is None or obj.expiration_time <= datetime.now(timezone.utc):
+            raise KeyError(f"File {name} not found")
+        return obj
+
+    def delete(self, name):
+        with self._lock:
+            self._files.pop(name, None)
+
+    def list(self):
+        with self._lock:
+            return list(self._files.values())
+
+    def expire_all(self):
+        """Simulate the server dropping every file (e.g. after 48h)."""
+        with self._lock:
+            self._files.clear()
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModels:
+    """
+    Mimics client.models.generate_content(_stream): answers with one JSON
+    component line per component in the prompt, after a latency that grows
+    with the estimated input tokens, like the real API does. failure_rate
+    is the chance each call fails with a transient error.
+    """
+
+    def __init__(self, base_latency=0.5, seconds_per_1k_tokens=0.05, failure_rate=0.0):
+        self.failure_rate = failure_rate
+        self.base_latency = base_latency
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+        self.calls = 0
+        self.input_tokens = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _answer(self, contents):
+        """(estimated input tokens, response text) for a prompt."""
+        from prompts import estimate_tokens
+        from grouping import part_stem
+
+        tokens = sum(len(p) // 4 if isinstance(p, str) else estimate_tokens(p) for p in contents)
+        rows = []
+        component = set()   # part stems of the COMPONENT the following files belong to
+        for part in contents:
+            if not isinstance(part, str):
+                continue
+            header = _COMPONENT.match(part)
+            if header is not None:
+                component = {header.group(1).lower()}
+                component.update(a.lower() for a in (header.group(2) or "").split(", ") if a)
+                rows.append(self._row(header.group(1)))
+                continue
+            label = _FILE.match(part)
+            if label is not None and part_stem(label.group(1)) not in component:
+                # A single-file part: the component above has ended
+                component = set()
+                rows.append(self._row(label.group(1)))
+        return tokens, "```json\n" + "\n".join(rows) + "\n```"
+
+    @staticmethod
+    def _row(name):
+        stem = os.path.splitext(os.path.basename(name))[0]
+        return json.dumps({"part_name": stem, "material": "AL6061", "quantity": 1, "finish": "黑色阳极氧化"},
+                          ensure_ascii=False)
+
+    def _enter(self, tokens):
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += tokens
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+
+    def _leave(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def generate_content(self, model, contents, config=None):
+        tokens, text = self._answer(contents)
+        self._enter(tokens)
+        try:
+            time.sleep(self.base_latency + self.seconds_per_1k_tokens * tokens / 1000)
+        finally:
+            self._leave()
+        maybe_fail(self.failure_rate)
+        return FakeResponse(text)
+
+    def generate_content_stream(self, model, contents, config=None, chunk_chars=64):
+        """Like generate_content, but the text arrives in chunks spread over the latency."""
+        tokens, text = self._answer(contents)
+        self._enter(tokens)
+        try:
+            time.sleep(self.base_latency)
+            maybe_fail(self.failure_rate)
+            chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+            pause = self.seconds_per_1k_tokens * tokens / 1000 / max(len(chunks), 1)
+            for chunk in chunks:
+                time.sleep(pause)
+                yield FakeResponse(chunk)
+        finally:
+            self._leave()
+
+
+class FakeClient:
+    def __init__(self, files=None, models=None, failure_rate=0.0):
+        self.files = files or FakeFiles(failure_rate=failure_rate)
+        self.models = models or FakeModels(failure_rate=failure_rate)
+
+
+# Command line that makes this file behave like `soffice --convert-to ...`
+FAKE_SOFFICE = [sys.executable, os.path.abspath(__file__), "soffice"]
+
+# Minimal one-page PDF written for every "converted" document
+_FAKE_PDF = (b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+             b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+             b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+             b"trailer<</Root 1 0 R>>\n%%EOF\n")
+
+
+def fake_soffice(args):
+    """Accepts soffice's headless arguments and writes a stub PDF per input file.
+    Inputs whose name contains "crash" make it exit non-zero without output."""
+    outdir = args[args.index("--outdir") + 1]
+    fmt = args[args.index("--convert-to") + 1]
+    inputs = [a for a in args[args.index("--outdir") + 2:]]
+    if any("crash" in os.path.basename(p) for p in inputs):
+        return 1
+    for path in inputs:
+        name = os.path.splitext(os.path.basename(path))[0] + "." + fmt
+        with open(os.path.join(outdir, name), "wb") as f:
+            f.write(_FAKE_PDF)
+    return 0
+
+
+# Command line that stands in for dwg.py's batch converter (no ODA or ezdxf needed)
+FAKE_DWG = [sys.executable, os.path.abspath(__file__), "dwg"]
+
+# 1x1 white PNG written as every "rendered" drawing
+_FAKE_PNG = bytes.fromhex("89504e470d0a1a0a0000000d4948445200000001000000010800000000"
+                          "3a7e9b550000000a49444154789c63f80f00000101000518d84e0000000049454e44ae426082")
+
+
+def fake_dwg(args):
+    """Accepts dwg.py's arguments and writes a stub sheet image and text per input file.
+    Inputs whose name contains "crash" make it exit non-zero without output."""
+    outdir = args[args.index("--outdir") + 1]
+    inputs = args[args.index("--scratch") + 2:]
+    if any("crash" in os.path.basename(p) for p in inputs):
+        return 1
+    for path in inputs:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        with open(os.path.join(outdir, stem + ".png"), "wb") as f:
+            f.write(_FAKE_PNG)
+        info = {"drawing_text": f"[title block]\nPART NAME: {stem}\n[dimensions]\n100, 50, Ø6",
+                "width": 1, "height": 1, "annotations": 1, "dimensions": 3}
+        with open(os.path.join(outdir, stem + ".json"), "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["soffice"]:
+        sys.exit(fake_soffice(sys.argv[2:]))
+    if sys.argv[1:2] == ["dwg"]:
+        sys.exit(fake_dwg(sys.argv[2:]))
+    sys.exit(f"unknown fake tool: {sys.argv[1:2]}")
@@ -0,0 +1,296 @@
+"""
+Rate-limited, retrying Gemini client.
+
+Every call goes through one asyncio event loop: a token bucket caps the
+request rate, a semaphore caps calls in flight, and errors the API marks
+as transient (429, 5xx, dropped connections) are retried with exponential
+backoff and full jitter. Calls run on the SDK's async client (client.aio,
+one shared HTTP connection pool) when it has one, otherwise on the
+synchronous client in a thread.
+
+GeminiClient also keeps the synchronous client.files / client.models
+interface, so the thread-pooled pipeline uses it as a drop-in for
+genai.Client:
+
+    client = gemini.connect()              # or GeminiClient(FakeClient())
+    client.files.upload(file=path, config=...)
+    for chunk in client.models.generate_content_stream(model=..., contents=...): ...
+    await client.generate_content(model=..., contents=...)   # from async code
+"""
+import os
+import time
+import queue
+import random
+import asyncio
+import threading
+import lazy
+
+# ---- CONFIG: Gemini request limits ----
+REQUESTS_PER_SECOND = 5.0     # token bucket refill rate
+BURST = 10                    # requests allowed back to back
+MAX_IN_FLIGHT = 16            # concurrent calls of any kind
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0            # seconds; doubles per attempt, full jitter
+BACKOFF_MAX = 30.0
+# ---------------------------------------
+
+# HTTP status codes worth another attempt
+RETRY_CODES = (408, 429, 500, 502, 503, 504)
+
+
+def transport_errors():
+    """httpx's TransportError (dropped connections, timeouts, what the SDK's transport raises), if installed."""
+    try:
+        return (lazy.load("httpx").TransportError,)
+    except ImportError:
+        return ()
+
+
+def is_retryable(error):
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(code, int):
+        return code in RETRY_CODES
+    return isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError) + transport_errors())
+
+
+class TokenBucket:
+    """Allows rate acquisitions per second on average, up to burst at once."""
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CallStats:
+    """Latency of successful calls, plus retry and failure counts, per operation."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.retries = {}
+        self.failures = {}
+        self._lock = threading.Lock()
+
+    def record(self, op, seconds=None, retried=False, failed=False):
+        with self._lock:
+            if seconds is not None:
+                self.latencies.setdefault(op, []).append(seconds)
+            if retried:
+                self.retries[op] = self.retries.get(op, 0) + 1
+            if failed:
+                self.failures[op] = self.failures.get(op, 0) + 1
+
+    def summary(self):
+        with self._lock:
+            ops = set(self.latencies) | set(self.retries) | set(self.failures)
+            result = {}
+            for op in sorted(ops):
+                times = sorted(self.latencies.get(op, []))
+                result[op] = {
+                    "calls": len(times),
+                    "p50": times[len(times) // 2] if times else None,
+                    "p95": times[min(len(times) - 1, int(len(times) * 0.95))] if times else None,
+                    "max": times[-1] if times else None,
+                    "retries": self.retries.get(op, 0),
+                    "failures": self.failures.get(op, 0),
+                }
+            return result
+
+    def report(self):
+        for op, s in self.summary().items():
+            timing = f"p50 {s['p50']:.2f}s, p95 {s['p95']:.2f}s, max {s['max']:.2f}s" if s["calls"] else "no successes"
+            print(f"gemini {op}: {s['calls']} calls, {timing}, {s['retries']} retries, {s['failures']} failed")
+
+
+class GeminiClient:
+    """
+    Wraps a genai.Client (or fakes.FakeClient). The event loop runs on a
+    daemon thread owned by the wrapper; close() stops it.
+    """
+
+    def __init__(self, client, rate=REQUESTS_PER_SECOND, burst=BURST, max_in_flight=MAX_IN_FLIGHT,
+                 max_attempts=MAX_ATTEMPTS, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+        self.client = client
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = CallStats()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="gemini-loop", daemon=True)
+        self._thread.start()
+        self._bucket = self._run(self._make(TokenBucket, rate, burst))
+        self._slots = self._run(self._make(asyncio.Semaphore, max_in_flight))
+        self.files = _SyncFiles(self)
+        self.models = _SyncModels(self)
+
+    @staticmethod
+    async def _make(cls, *args):
+        # asyncio primitives are created on the loop that uses them
+        return cls(*args)
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _call(self, op, sync_fn, async_fn=None, before_attempt=None, **kwargs):
+        for attempt in range(1, self.max_attempts + 1):
+            if before_attempt is not None:
+                before_attempt()
+            await self._bucket.acquire()
+            async with self._slots:
+                start = time.perf_counter()
+                try:
+                    if async_fn is not None:
+                        result = await async_fn(**kwargs)
+                    else:
+                        result = await asyncio.to_thread(sync_fn, **kwargs)
+                except Exception as e:
+                    error = e
+                else:
+                    self.stats.record(op, time.perf_counter() - start)
+                    return result
+            if attempt == self.max_attempts or not is_retryable(error):
+                self.stats.record(op, failed=True)
+                raise error
+            await self._backoff(op, error, attempt)
+
+    async def _backoff(self, op, error, attempt):
+        self.stats.record(op, retried=True)
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        print(f"gemini {op}: {error} (attempt {attempt}/{self.max_attempts}), retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    def _aio(self, section, name):
+        aio = getattr(self.client, "aio", None)
+        return getattr(getattr(aio, section, None), name, None)
+
+    # ---- async API ----
+    async def upload(self, file, config=None):
+        # File objects are re-read from the start on every attempt
+        rewind = (lambda: file.seek(0)) if hasattr(file, "seek") else None
+        return await self._call("upload", self.client.files.upload, self._aio("files", "upload"),
+                                before_attempt=rewind, file=file, config=config)
+
+    async def get_file(self, name):
+        return await self._call("get", self.client.files.get, self._aio("files", "get"), name=name)
+
+    async def delete_file(self, name):
+        return await self._call("delete", self.client.files.delete, self._aio("files", "delete"), name=name)
+
+    async def generate_content(self, model, contents, config=None):
+        kwargs = dict(model=model, contents=contents)
+        if config is not None:
+            kwargs["config"] = config
+        return await self._call("generate", self.client.models.generate_content,
+                                self._aio("models", "generate_content"), **kwargs)
+
+    async def generate_content_stream(self, model, contents, config=None):
+        """
+        Async iterator over response chunks. Failures before the first chunk
+        are retried like any call; once text has been handed out a failure
+        is raised, since the caller has already used part of the answer.
+        """
+        kwargs = dict(model=model, contents=contents)
+        if config is not None:
+            kwargs["config"] = config
+        aio_fn = self._aio("models", "generate_content_stream")
+        for attempt in range(1, self.max_attempts + 1):
+            await self._bucket.acquire()
+            started = False
+            async with self._slots:
+                start = time.perf_counter()
+                try:
+                    if aio_fn is not None:
+                        async for chunk in await aio_fn(**kwargs):
+                            started = True
+                            yield chunk
+                    else:
+                        chunks = await asyncio.to_thread(self.client.models.generate_content_stream, **kwargs)
+                        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                            started = True
+                            yield chunk
+                except Exception as e:
+                    error = e
+                else:
+                    self.stats.record("stream", time.perf_counter() - start)
+                    return
+            if started or attempt == self.max_attempts or not is_retryable(error):
+                self.stats.record("stream", failed=True)
+                raise error
+            await self._backoff("stream", error, attempt)
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _SyncFiles:
+    """client.files for callers on ordinary threads."""
+
+    def __init__(self, owner):
+        self._owner = owner
+
+    def upload(self, file, config=None):
+        return self._owner._run(self._owner.upload(file, config))
+
+    def get(self, name):
+        return self._owner._run(self._owner.get_file(name))
+
+    def delete(self, name):
+        return self._owner._run(self._owner.delete_file(name))
+
+
+class _SyncModels:
+    """client.models for callers on ordinary threads."""
+
+    def __init__(self, owner):
+        self._owner = owner
+
+    def generate_content(self, model, contents, config=None):
+        return self._owner._run(self._owner.generate_content(model, contents, config))
+
+    def generate_content_stream(self, model, contents, config=None):
+        chunks = queue.Queue()
+
+        async def pump():
+            try:
+                async for chunk in self._owner.generate_content_stream(model, contents, config):
+                    chunks.put((chunk, None))
+            except Exception as e:
+                chunks.put((None, e))
+            else:
+                chunks.put((None, None))
+
+        asyncio.run_coroutine_threadsafe(pump(), self._owner._loop)
+        while True:
+            chunk, error = chunks.get()
+            if error is not None:
+                raise error
+            if chunk is None:
+                return
+            yield chunk
+
+
+def connect(api_key=None, **limits):
+    """GeminiClient around a genai.Client for GOOGLE_API_KEY."""
+    genai = lazy.load("google.genai")
+    return GeminiClient(genai.Client(api_key=api_key or os.environ["GOOGLE_API_KEY"]), **limits)
@@ -0,0 +1,98 @@
+import os
+import json
+import hashlib
+import lazy
+
+# Bump when shape_fingerprint changes (part of the conversion cache key)
+FINGERPRINT_VERSION = 1
+MESH_CELLS = 200   # the coarse fingerprint mesh resolves 1/MESH_CELLS of the part's diagonal
+
+
+def part_stem(rel_path):
+    """Part name shared by a part's .stp/.pdf/.dwg files, e.g. 'j118-lx-04-08'."""
+    return os.path.splitext(os.path.basename(rel_path))[0].lower()
+
+
+def shape_fingerprint(shape):
+    """
+    Geometry fingerprint of a loaded STEP shape that ignores its file name,
+    header and position in space: volume, area, sorted bounding-box extents
+    and a hash of a coarse tessellation translated to the origin. Runs in
+    the conversion worker, on the shape it already imported for the render.
+    """
+    from conversion import tessellate
+
+    np = lazy.load("numpy")
+    bb = shape.BoundingBox()
+    quantum = max(bb.DiagonalLength / MESH_CELLS, 1e-6)
+    vertices, _ = tessellate(shape, quantum)
+    grid = np.round((vertices - vertices.min(axis=0)) / quantum).astype(np.int64)
+    grid = np.unique(grid, axis=0)
+    summary = {
+        "volume": f"{shape.Volume():.6g}",
+        "area": f"{shape.Area():.6g}",
+        "extents": sorted(f"{d:.4g}" for d in (bb.xlen, bb.ylen, bb.zlen)),
+        "mesh": hashlib.sha256(grid.tobytes()).hexdigest(),
+    }
+    return hashlib.sha256(json.dumps(summary, sort_keys=True).encode()).hexdigest()
+
+
+class PartGroup:
+    """One component: every file that shares its part stem or its STEP geometry."""
+
+    def __init__(self, stem):
+        self.stem = stem
+        self.files = []            # (rel_path, abs_path, ext)
+        self.aliases = []          # other part names with the same geometry
+
+    @property
+    def step_files(self):
+        return [f for f in self.files if f[2] == '.stp']
+
+    def __repr__(self):
+        return f"PartGroup({self.stem!r}, {[f[0] for f in self.files]})"
+
+
+def group_files(file_list, fingerprints):
+    """
+    Group a scan by part stem, then merge groups whose STEP bodies are
+    geometrically identical. fingerprints maps STEP rel_paths to their
+    shape_fingerprint, as conversion.upload_files collects them; STEP files
+    without one (failed conversions) are grouped by stem only.
+    Returns (groups, duplicates): groups in scan order, and a dict mapping
+    each redundant STEP rel_path to the first STEP with its geometry.
+    """
+    groups = {}
+    for item in file_list:
+        groups.setdefault(part_stem(item[0]), PartGroup(part_stem(item[0]))).files.append(item)
+
+    step_files = [f for g in groups.values() for f in g.step_files if f[0] in fingerprints]
+
+    canonical = {}    # fingerprint -> rel_path of the first STEP with it
+    duplicates = {}
+    for rel_path, _, _ in step_files:
+        first = canonical.setdefault(fingerprints[rel_path], rel_path)
+        if first != rel_path:
+            duplicates[rel_path] = first
+
+    # Fold the group of each duplicate STEP into the group of its canonical STEP
+    merged_into = {}
+
+    def resolve(stem):
+        while stem in merged_into:
+            stem = merged_into[stem]
+        return stem
+
+    for rel_path, first in duplicates.items():
+        source, target = groups[resolve(part_stem(rel_path))], groups[resolve(part_stem(first))]
+        if source is target:
+            continue
+        target.files.extend(source.files)
+        target.aliases.append(source.stem)
+        target.aliases.extend(source.aliases)
+        merged_into[source.stem] = target.stem
+        del groups[source.stem]
+
+    if duplicates:
+        print(f"grouping: {len(duplicates)} STEP files share geometry with another part")
+    return list(groups.values()), duplicates
@@ -0,0 +1,298 @@
+"""
+Crash-safe record of one job's finished steps, so a killed run can resume.
+
+Each finished step is one JSON line appended with a single write and
+fsync'd before the run moves on: a file converted (with the artifacts it
+left on disk), a file uploaded (its Gemini handle) and a model batch
+answered (its text). A crash leaves at most a torn last line, which is
+ignored when the journal is read back. Processing the same folder again
+skips every recorded step whose source file is unchanged: live handles
+are reused without converting, recorded renders are uploaded without
+rendering, and answered batches are not sent again. The last record of a
+finished job is "finished"; the next run of the folder starts afresh.
+
+cleanup() removes what crashed runs leave behind: temporary payloads that
+were never uploaded, the renders/STLs of abandoned jobs, half-written
+STLs (.part) and scratch files of the caches.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from datetime import datetime, timezone
+from cache import CACHE_DIR
+from uploads import EXPIRY_MARGIN   # don't resume with a handle that is about to expire
+import drawings
+
+# ---- CONFIG: job journals ----
+JOURNAL_DIR = os.path.join(CACHE_DIR, "journals")
+JOURNAL_MAX_AGE = 7 * 24 * 3600   # seconds before an unfinished journal counts as abandoned
+STALE_SECONDS = 3600              # scratch files older than this belong to a dead run
+# ------------------------------
+
+# Info keys kept with an upload: what drawings.attach needs to rebuild a Drawing
+_INFO_KEYS = ("drawing_text", "width", "height", "fingerprint")   # conversion info kept for resuming
+
+
+def journal_path(folder):
+    folder_id = hashlib.sha1(os.path.abspath(folder).encode()).hexdigest()
+    return os.path.join(JOURNAL_DIR, folder_id + ".jsonl")
+
+
+def source_signature(abs_path):
+    """[size, mtime_ns] of a source file; a changed file does not resume from the journal."""
+    st = os.stat(abs_path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _artifact(path):
+    st = os.stat(path)
+    return [path, st.st_size, st.st_mtime_ns]
+
+
+def read_records(path):
+    """The complete records of a journal file; a torn last line is dropped."""
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break   # the write was cut short by a crash
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+    return records
+
+
+class Journal:
+    """
+    Append-only journal of one folder's job. Thread safe: uploads are
+    recorded from the upload threads and batches from the sender threads.
+    """
+
+    def __init__(self, folder, output_dirs=(), path=None):
+        self.folder = os.path.abspath(folder)
+        self.path = path or journal_path(folder)
+        self.resumed = 0
+        self.converted = {}   # rel_path -> record
+        self.uploaded = {}    # rel_path -> record
+        self.analyzed = {}    # prompt key -> record
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        records = read_records(self.path) if os.path.isfile(self.path) else []
+        if records and records[-1]["stage"] == "finished":
+            records = []
+        self.resuming = bool(records)
+        self._leftover = records
+        for record in records:
+            if record["stage"] == "converted":
+                self.converted[record["rel_path"]] = record
+            elif record["stage"] == "uploaded":
+                self.uploaded[record["rel_path"]] = record
+            elif record["stage"] == "analyzed":
+                self.analyzed[record["key"]] = record
+        # Rewrite the complete records so appends never follow a torn line
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for record in records or [{"stage": "started", "folder": self.folder, "time": time.time(),
+                                       "output_dirs": [os.path.abspath(d) for d in output_dirs if d]}]:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+
+    def _append(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            if self._fd is None:
+                return
+            # One write per record: O_APPEND keeps lines whole, fsync makes the step durable
+            os.write(self._fd, line)
+            os.fsync(self._fd)
+
+    def _unchanged(self, record, abs_path):
+        try:
+            return record["source"] == source_signature(abs_path)
+        except OSError:
+            return False
+
+    def record_converted(self, rel_path, abs_path, converted, artifacts=()):
+        """converted is convert_file's tuple; artifacts are the other files the conversion wrote."""
+        payload, mime_type, is_temp, info = converted
+        path = None if isinstance(payload, bytes) else os.path.abspath(payload)
+        self._append({"stage": "converted", "rel_path": rel_path, "source": source_signature(abs_path),
+                      "payload": path, "mime_type": mime_type, "temp": is_temp,
+                      "info": {k: info[k] for k in _INFO_KEYS if k in info},
+                      "artifacts": [_artifact(p) for p in artifacts if os.path.isfile(p)]})
+
+    def converted_result(self, rel_path, abs_path):
+        """convert_file's tuple for a recorded conversion whose output file is still there, else None."""
+        record = self.converted.get(rel_path)
+        if record is None or record["payload"] is None or not self._unchanged(record, abs_path):
+            return None
+        if not os.path.isfile(record["payload"]):
+            return None
+        self.resumed += 1
+        return record["payload"], record["mime_type"], record["temp"], dict(record["info"])
+
+    def record_uploaded(self, rel_path, abs_path, obj, info):
+        expires = getattr(obj, "expiration_time", None)
+        self._append({"stage": "uploaded", "rel_path": rel_path, "source": source_signature(abs_path),
+                      "name": obj.name, "expires": expires.isoformat() if expires else None,
+                      "info": {k: info[k] for k in _INFO_KEYS if k in info}})
+
+    def uploaded_handle(self, client, rel_path, abs_path):
+        """The live file handle a recorded upload left (a Drawing for drawings), else None."""
+        record = self.uploaded.get(rel_path)
+        if record is None or not self._unchanged(record, abs_path):
+            return None
+        if record["expires"] and (datetime.fromisoformat(record["expires"]) - EXPIRY_MARGIN
+                                  <= datetime.now(timezone.utc)):
+            return None
+        try:
+            obj = client.files.get(name=record["name"])
+        except Exception:
+            return None   # deleted on the server side
+        self.resumed += 1
+        return drawings.attach(obj, record["info"])
+
+    def uploaded_info(self, rel_path):
+        """The conversion info recorded with an upload (drawing text, STEP fingerprint)."""
+        return dict(self.uploaded[rel_path]["info"])
+
+    def record_analyzed(self, batch, key, text):
+        self._append({"stage": "analyzed", "batch": batch, "key": key, "text": text})
+
+    def analyzed_text(self, key):
+        """The recorded answer to a batch with this prompt key (see responses.prompt_key), else None."""
+        record = self.analyzed.get(key)
+        if record is None:
+            return None
+        with self._lock:
+            self.resumed += 1
+        return record["text"]
+
+    def cleanup(self):
+        """
+        Delete what the interrupted run left that nobody will use: temporary
+        payloads converted but never uploaded, and stale half-written STLs in
+        the job's output folders. Returns the number of files removed.
+        """
+        removed = 0
+        for rel_path, record in self.converted.items():
+            if record["temp"] and rel_path not in self.uploaded:
+                removed += _remove(record["payload"])
+        for record in self._leftover:
+            if record["stage"] == "started":
+                removed += _sweep_partial(record.get("output_dirs", ()))
+        self._leftover = []
+        return removed
+
+    def finish(self):
+        """Mark the job done; the next run of the folder starts a new journal."""
+        self._append({"stage": "finished", "time": time.time()})
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def report(self):
+        if self.resuming:
+            print(f"journal: resumed {self.resumed} step(s) of the interrupted run")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+        return 1
+    except (OSError, TypeError):
+        return 0
+
+
+def _is_stale(path, now=None):
+    try:
+        return (now or time.time()) - os.path.getmtime(path) > STALE_SECONDS
+    except OSError:
+        return False
+
+
+def _sweep_partial(dirs):
+    """Remove stale *.part files (STLs whose writer died) from dirs."""
+    removed = 0
+    for folder in dirs:
+        if not os.path.isdir(folder):
+            continue
+        for entry in os.scandir(folder):
+            if entry.name.endswith(".part") and _is_stale(entry.path):
+                removed += _remove(entry.path)
+    return removed
+
+
+def _sweep_cache(root=CACHE_DIR):
+    """Remove stale scratch files of the caches: ArtifactCache .tmp-* dirs and mkstemp *.tmp files."""
+    removed = 0
+    if not os.path.isdir(root):
+        return 0
+    for entry in os.scandir(root):
+        if not entry.is_dir():
+            continue
+        for sub in os.scandir(entry.path):
+            if sub.name.startswith(".tmp-") and sub.is_dir() and _is_stale(sub.path):
+                shutil.rmtree(sub.path, ignore_errors=True)
+                removed += 1
+            elif sub.name.endswith(".tmp") and sub.is_file() and _is_stale(sub.path):
+                removed += _remove(sub.path)
+    return removed
+
+
+def cleanup(journal_dir=JOURNAL_DIR, max_age=JOURNAL_MAX_AGE):
+    """
+    Sweep every journal. Finished journals are dropped; unfinished ones whose
+    folder is gone or that are older than max_age are abandoned, and the
+    renders/STLs and temporary payloads they recorded are deleted with them
+    (artifacts changed since are left alone). Stale partial files of the
+    caches and output folders go too. Returns the number of files removed.
+    """
+    removed = 0
+    now = time.time()
+    names = sorted(os.listdir(journal_dir)) if os.path.isdir(journal_dir) else []
+    for name in names:
+        path = os.path.join(journal_dir, name)
+        if not name.endswith(".jsonl"):
+            continue
+        records = read_records(path)
+        started = next((r for r in records if r["stage"] == "started"), {})
+        removed += _sweep_partial(started.get("output_dirs", ()))
+        if records and records[-1]["stage"] == "finished":
+            _remove(path)
+            continue
+        if os.path.isdir(started.get("folder", "")) and now - os.path.getmtime(path) <= max_age:
+            continue   # may still be resumed
+        uploaded = {r["rel_path"] for r in records if r["stage"] == "uploaded"}
+        for record in records:
+            if record["stage"] != "converted":
+                continue
+            for artifact, size, mtime in record["artifacts"]:
+                try:
+                    st = os.stat(artifact)
+                except OSError:
+                    continue
+                if [st.st_size, st.st_mtime_ns] == [size, mtime]:
+                    removed += _remove(artifact)
+            if record["temp"] and record["rel_path"] not in uploaded:
+                removed += _remove(record["payload"])
+        _remove(path)
+        print(f"journal: dropped the abandoned job {started.get('folder', name)}")
+    return removed + _sweep_cache()
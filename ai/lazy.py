@@ -0,0 +1,29 @@
+import sys
+import time
+import importlib
+
+# module name -> seconds its first import took in this process
+IMPORT_TIMES = {}
+
+
+def load(module_name):
+    """
+    Import a heavy backend (cadquery, pyvista, pandas, google.genai, …) the
+    first time a file actually needs it, and remember how long that took.
+    """
+    module = sys.modules.get(module_name)
+    # A module another thread is still importing is already in sys.modules, half
+    # initialised; import_module waits for that import to finish
+    if module is not None and not getattr(module.__spec__, "_initializing", False):
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    IMPORT_TIMES[module_name] = time.perf_counter() - start
+    return module
+
+
+def report():
+    if not IMPORT_TIMES:
+        print("imports: no heavy backends loaded")
+    for name, seconds in sorted(IMPORT_TIMES.items(), key=lambda kv: -kv[1]):
+        print(f"import {name}: {seconds:.2f}s")
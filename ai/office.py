@@ -0,0 +1,153 @@
+import os
+import queue
+import shutil
+import signal
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import tracing
+
+# ---- CONFIG: headless LibreOffice ----
+OFFICE_COMMAND = [shutil.which("soffice") or shutil.which("libreoffice") or "libreoffice"]
+OFFICE_INSTANCES = 2      # LibreOffice processes converting at the same time
+OFFICE_TIMEOUT = 120      # seconds per document before an instance is killed
+# --------------------------------------
+
+# Documents converted to PDF by LibreOffice
+OFFICE_EXTENSIONS = ('.pptx',)
+
+
+class OfficePool:
+    """
+    Converts office documents to PDF with a few headless LibreOffice
+    instances. Each instance has its own profile directory that lives as
+    long as the pool, so only the first start pays for profile creation and
+    instances never fight over a shared profile lock. Documents are handed
+    to each instance in batches (one process start per batch) and written to
+    a scratch directory, never into the customer folder. An instance that
+    times out or crashes is killed, gets a fresh profile, and its unfinished
+    documents are retried one at a time.
+    """
+
+    TOOL = "LibreOffice"
+    SPAN = "office.run"
+
+    def __init__(self, instances=OFFICE_INSTANCES, timeout=OFFICE_TIMEOUT, command=None):
+        self.instances = instances
+        self.timeout = timeout
+        self.command = list(command or OFFICE_COMMAND)
+        self.restarts = 0
+        self._root = tempfile.mkdtemp(prefix="office_pool_")
+        self._profiles = [self._new_profile(i) for i in range(instances)]
+        self._free_slots = queue.Queue()
+        for slot in range(instances):
+            self._free_slots.put(slot)
+
+    def _new_profile(self, slot):
+        return tempfile.mkdtemp(prefix=f"profile{slot}_", dir=self._root)
+
+    def _command(self, slot, paths, fmt, outdir):
+        return self.command + [
+            f"-env:UserInstallation=file://{self._profiles[slot]}",
+            "--headless", "--norestore", "--convert-to", fmt, "--outdir", outdir,
+        ] + list(paths)
+
+    def _read_output(self, outdir, path, fmt):
+        """The converted result for path, or None if the process did not write it."""
+        out = os.path.join(outdir, os.path.splitext(os.path.basename(path))[0] + "." + fmt)
+        if not os.path.isfile(out):
+            return None
+        with open(out, "rb") as f:
+            return f.read()
+
+    def _run(self, slot, paths, fmt):
+        """One converter process converting paths. Returns the scratch dir it wrote to."""
+        outdir = tempfile.mkdtemp(prefix="out_", dir=self._root)
+        cmd = self._command(slot, paths, fmt, outdir)
+        with tracing.span(self.SPAN, files=len(paths)) as s:
+            # Own process group, so a timeout also kills soffice.bin behind the wrapper script
+            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                    start_new_session=True)
+            timed_out = False
+            try:
+                proc.wait(timeout=self.timeout * len(paths))
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+                proc.wait()
+                timed_out = True
+            if proc.returncode != 0:
+                s.set(returncode=proc.returncode, error="timeout" if timed_out else "crashed")
+        if proc.returncode != 0:
+            # Crashed or killed: the profile may be left locked or half-written
+            shutil.rmtree(self._profiles[slot], ignore_errors=True)
+            self._profiles[slot] = self._new_profile(slot)
+            self.restarts += 1
+        return outdir
+
+    def _convert_chunk(self, slot, paths, fmt):
+        results = {}
+        outdir = self._run(slot, paths, fmt)
+        missing = []
+        for path in paths:
+            result = self._read_output(outdir, path, fmt)
+            if result is not None:
+                results[path] = result
+            else:
+                missing.append(path)
+        shutil.rmtree(outdir, ignore_errors=True)
+
+        if len(paths) > 1:
+            # Retry whatever the batch did not produce, one document per process
+            for path in missing:
+                results.update(self._convert_chunk(slot, [path], fmt))
+        elif missing:
+            results[missing[0]] = RuntimeError(f"{self.TOOL} failed for {missing[0]}")
+        return results
+
+    def convert(self, paths, fmt="pdf"):
+        """
+        Convert documents to fmt. Returns dict path -> converted bytes, or an
+        exception for documents that could not be converted. Never raises:
+        when the converter cannot be started at all, every document of the
+        batch gets that error.
+        """
+        # Spread over the instances; a batch must not hold two files with the
+        # same name, since LibreOffice names outputs after the input file
+        chunks = [{} for _ in range(min(self.instances, len(paths)))]
+        for i, path in enumerate(paths):
+            name = os.path.splitext(os.path.basename(path))[0]
+            start = i % len(chunks)
+            for chunk in chunks[start:] + chunks[:start]:
+                if name not in chunk:
+                    chunk[name] = path
+                    break
+            else:
+                chunks.append({name: path})
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.instances) as runners:
+            futures = {runners.submit(self._convert_on_free_slot, list(chunk.values()), fmt): chunk
+                       for chunk in chunks}
+            for future, chunk in futures.items():
+                try:
+                    results.update(future.result())
+                except Exception as e:   # e.g. FileNotFoundError/OSError for a missing or broken command
+                    print(f"{self.TOOL} could not run: {e}")
+                    results.update({path: e for path in chunk.values()})
+        return results
+
+    def _convert_on_free_slot(self, paths, fmt):
+        slot = self._free_slots.get()
+        try:
+            return self._convert_chunk(slot, paths, fmt)
+        finally:
+            self._free_slots.put(slot)
+
+    def close(self):
+        shutil.rmtree(self._root, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,262 @@
+import os
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+import grouping
+import drawings
+import sheets
+import tracing
+from conversion import WINDOW_SIZE
+from responses import prompt_key
+
+# ---- CONFIG: prompt batching ----
+MODEL = "gemini-2.5-flash"
+TOKEN_BUDGET = 32_000            # estimated input tokens per generate_content call
+MAX_CONCURRENT_REQUESTS = 4      # batches in flight at the same time
+# ---------------------------------
+
+# Rough Gemini input costs, used only to pack batches
+TOKENS_PER_TILE = 258            # per 768x768 image tile, and per PDF page
+IMAGE_TILE = 768
+PDF_BYTES_PER_PAGE = 100_000     # drawings average about this much per page
+TEXT_BYTES_PER_TOKEN = 3         # CSV with Chinese headers tokenizes densely
+LABEL_TOKENS = 20                # the "--- FILE: … ---" line around each file
+
+# Files that describe one part. A group with none of them (a BOM, a
+# presentation) is project-wide context and is attached to every batch
+PART_EXTENSIONS = ('.stp', '.pdf', '.dwg', '.dxf')
+
+
+def image_tokens(width, height):
+    return TOKENS_PER_TILE * math.ceil(width / IMAGE_TILE) * math.ceil(height / IMAGE_TILE)
+
+
+def estimate_tokens(file_obj):
+    """Estimated input tokens for one attached file (None: just its label)."""
+    if file_obj is None:
+        return LABEL_TOKENS
+    if isinstance(file_obj, sheets.Tile):
+        # The sheet is attached once per batch; count each tile's share of it
+        sheet = file_obj.sheet
+        return LABEL_TOKENS + math.ceil(image_tokens(sheet.width, sheet.height) / len(sheet.tiles))
+    if isinstance(file_obj, drawings.Drawing):
+        text_tokens = math.ceil(len(file_obj.text.encode("utf-8")) / TEXT_BYTES_PER_TOKEN)
+        return LABEL_TOKENS + text_tokens + image_tokens(file_obj.width, file_obj.height)
+    mime_type = getattr(file_obj, "mime_type", "") or ""
+    size = getattr(file_obj, "size_bytes", 0) or 0
+    if mime_type.startswith("image/"):
+        return LABEL_TOKENS + image_tokens(*WINDOW_SIZE)
+    if mime_type == "application/pdf":
+        return LABEL_TOKENS + TOKENS_PER_TILE * max(1, math.ceil(size / PDF_BYTES_PER_PAGE))
+    return LABEL_TOKENS + math.ceil(size / TEXT_BYTES_PER_TOKEN)
+
+
+def stem_groups(uploaded_files):
+    """Group rel_paths by part stem only (no geometry check), in first-seen order."""
+    groups = {}
+    for rel_path in uploaded_files:
+        stem = grouping.part_stem(rel_path)
+        groups.setdefault(stem, grouping.PartGroup(stem)).files.append((rel_path, None, None))
+    return list(groups.values())
+
+
+def is_shared(group):
+    """True for a group of project-wide files: no STEP or drawing matches its stem."""
+    return not any(os.path.splitext(rel_path)[1].lower() in PART_EXTENSIONS for rel_path, _, _ in group.files)
+
+
+def group_tokens(group, uploaded_files):
+    seen = set()
+    tokens = 0
+    for rel_path, _, _ in group.files:
+        file_obj = uploaded_files.get(rel_path)
+        if file_obj is not None and id(file_obj) in seen:
+            tokens += LABEL_TOKENS  # shared render, attached once
+            continue
+        seen.add(id(file_obj))
+        tokens += estimate_tokens(file_obj)
+    return tokens
+
+
+def build_contents(uploaded_files: dict, repo_name: str, instructions: str, groups=None, batch_note=None):
+    """
+    Prompt parts for Gemini. With groups (from grouping.group_files) files are
+    listed per component, and a STEP render shared by several files is
+    attached only once. Groups of project-wide files (see is_shared) come
+    first, as context rather than components.
+    """
+    parts = []
+    parts.append(f"Project Directory: {repo_name}/\n")
+    shared = []
+    if groups is None:
+        # One file per entry, as before grouping existed
+        groups = []
+        for rel_path in uploaded_files:
+            group = grouping.PartGroup(rel_path)
+            group.files.append((rel_path, None, None))
+            groups.append(group)
+    else:
+        if not all(is_shared(group) for group in groups):
+            shared = [group for group in groups if is_shared(group)]
+            groups = [group for group in groups if not is_shared(group)]
+        parts.append(f"Components: {len(groups)}\n")
+    if batch_note:
+        parts.append(batch_note + "\n")
+    if shared:
+        parts.append("=== PROJECT FILES: context for every component below, not components themselves ===")
+        for group in shared:
+            for rel_path, _, _ in group.files:
+                file_obj = uploaded_files.get(rel_path)
+                parts.extend([f"--- PROJECT FILE: {rel_path} ---",
+                              file_obj if file_obj is not None else "\n [preview unavailable] ",
+                              "\n"])
+    attached = set()
+    for group in groups:
+        if len(group.files) > 1 or group.aliases:
+            same = f" (same part as: {', '.join(group.aliases)})" if group.aliases else ""
+            parts.append(f"=== COMPONENT: {group.stem}{same} ===")
+        for rel_path, _, _ in group.files:
+            file_obj = uploaded_files.get(rel_path)
+            if file_obj is not None and id(file_obj) in attached:
+                parts.append(f"--- FILE: {rel_path} (same geometry as the image above) ---")
+            elif isinstance(file_obj, sheets.Tile):
+                attached.add(id(file_obj))
+                sheet = file_obj.sheet
+                if id(sheet) not in attached:
+                    attached.add(id(sheet))
+                    parts.extend([
+                        f"--- CONTACT SHEET {sheet.number}: renders of {', '.join(sheet.labels)}, "
+                        f"each captioned with its file name ---",
+                        file_obj.file,
+                        "\n"
+                    ])
+                parts.append(f"--- FILE: {rel_path} (converted to image: the tile captioned "
+                             f"\"{file_obj.label}\" on contact sheet {sheet.number}) ---")
+            elif isinstance(file_obj, drawings.Drawing):
+                attached.add(id(file_obj))
+                parts.extend([
+                    f"--- FILE: {rel_path} (drawing: extracted title block text, then the sheet image) ---",
+                    file_obj.text + "\n",
+                    file_obj.file,
+                    "\n"
+                ])
+            elif file_obj is not None:
+                attached.add(id(file_obj))
+                file_note = " (converted to image for analysis)" if rel_path.lower().endswith('.stp') else ""
+                parts.extend([
+                    f"--- FILE: {rel_path}{file_note} ---",
+                    file_obj,
+                    "\n"
+                ])
+            else:
+                parts.extend([
+                    f"--- FILE: {rel_path} ---",
+                    "\n [preview unavailable] "
+                    "\n"
+                ])
+    parts.append(instructions)
+    return parts
+
+
+def plan_batches(uploaded_files, groups=None, budget=TOKEN_BUDGET):
+    """
+    Pack part families into batches of at most budget estimated tokens,
+    keeping each family in one batch and the scan order within a batch.
+    A family bigger than the budget gets a batch of its own. Project-wide
+    files (see is_shared) open every batch, and their tokens are reserved
+    in each batch's budget.
+    Returns a list of batches, each a list of PartGroup.
+    """
+    if groups is None:
+        groups = stem_groups(uploaded_files)
+    shared = [group for group in groups if is_shared(group)]
+    parts = [group for group in groups if not is_shared(group)]
+    if not parts:
+        # Nothing to share them with: they are the whole prompt
+        shared, parts = [], shared
+    budget -= sum(group_tokens(group, uploaded_files) for group in shared)
+    sized = [(group, group_tokens(group, uploaded_files)) for group in parts]
+
+    # First fit, largest first, so big families do not strand small leftovers
+    bins = []   # [tokens, [(position, group)]]
+    for position, (group, tokens) in sorted(enumerate(sized), key=lambda x: -x[1][1]):
+        for b in bins:
+            if b[0] + tokens <= budget:
+                b[0] += tokens
+                b[1].append((position, group))
+                break
+        else:
+            bins.append([tokens, [(position, group)]])
+
+    batches = [[g for _, g in sorted(members, key=lambda m: m[0])] for _, members in bins]
+    batches.sort(key=lambda batch: parts.index(batch[0]))
+    return [shared + batch for batch in batches]
+
+
+def generate_batches(batches, uploaded_files, repo_name, instructions, client,
+                     model=MODEL, max_concurrent=MAX_CONCURRENT_REQUESTS, cache=None, refresh=False,
+                     on_text=None, journal=None):
+    """
+    Send every batch to the model at the same time (up to max_concurrent).
+    With cache (a responses.ResponseCache) a batch whose prompt and files
+    are unchanged is answered from disk; refresh asks the model anyway.
+    With on_text the answers are streamed: on_text(batch_index, text) is
+    called for each chunk as it arrives, from the sender threads.
+    With journal (a journal.Journal) every answer is recorded as it
+    completes, and batches answered by an interrupted run are not sent again.
+    Returns the response texts in batch order; None for batches that failed.
+    """
+    def send(i, batch):
+        note = None
+        if len(batches) > 1:
+            note = (f"This is batch {i + 1} of {len(batches)}. The project's other components are sent "
+                    f"in other requests: give rows only for the components listed here.")
+            if any(is_shared(group) for group in batch):
+                note += (" The project files are attached to every batch;"
+                         + (" also give rows for components that appear only in them." if i == 0 else
+                            " use them as context only, components that appear only in them are listed"
+                            " by batch 1."))
+        contents = build_contents(uploaded_files, repo_name, instructions, batch, note)
+        with tracing.span("model.batch", batch=i, components=len(batch)) as s:
+            key = prompt_key(model, contents) if cache is not None or journal is not None else None
+            if key is not None and not refresh:
+                text = journal.analyzed_text(key) if journal is not None else None
+                if text is None and cache is not None:
+                    text = cache.get(key)
+                if text is not None:
+                    s.set(cached=True)
+                    if on_text is not None:
+                        on_text(i, text)
+                    return text
+            start = time.perf_counter()
+            if on_text is None:
+                text = client.models.generate_content(model=model, contents=contents).text
+            else:
+                pieces = []
+                for chunk in client.models.generate_content_stream(model=model, contents=contents):
+                    if chunk.text:
+                        if not pieces:
+                            s.set(first_chunk_seconds=round(time.perf_counter() - start, 3))
+                        pieces.append(chunk.text)
+                        on_text(i, chunk.text)
+                text = "".join(pieces)
+            s.set(bytes_in=len(text.encode("utf-8")))
+            if cache is not None:
+                # Stored per batch, so a rerun after a partial failure only asks for the rest
+                cache.put(key, text)
+            if journal is not None:
+                journal.record_analyzed(i, key, text)
+            return text
+
+    with ThreadPoolExecutor(max_workers=max_concurrent) as senders:
+        futures = [senders.submit(send, i, batch) for i, batch in enumerate(batches)]
+        texts = []
+        for i, future in enumerate(futures):
+            try:
+                texts.append(future.result())
+            except Exception as e:
+                print(f"Batch {i + 1}/{len(batches)} failed: {e}")
+                texts.append(None)
+    if cache is not None:
+        cache.report()
+    return texts
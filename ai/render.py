@@ -0,0 +1,63 @@
+import atexit
+import lazy
+
+pv = lazy.load("pyvista")
+
+# Camera presets the renderer knows about
+VIEWS = {
+    "iso": lambda plotter: plotter.view_isometric(render=False),
+    "top": lambda plotter: plotter.view_xy(render=False),
+    "front": lambda plotter: plotter.view_xz(render=False),
+    "side": lambda plotter: plotter.view_yz(render=False),
+}
+
+
+class PartRenderer:
+    """
+    Long-lived off-screen plotter. The render window and GL context are
+    created once; each part is swapped into the same scene, the camera is
+    fitted to it and every requested view is captured in one pass.
+    """
+
+    def __init__(self, window_size=(1920, 1080), color="tan"):
+        self.window_size = tuple(window_size)
+        self.color = color
+        self.plotter = pv.Plotter(off_screen=True, window_size=list(window_size))
+        self._actor = None
+        self.renders = 0
+
+    def render(self, mesh, outputs):
+        """Render mesh once per view. outputs: dict view name -> PNG path."""
+        if self._actor is not None:
+            self.plotter.remove_actor(self._actor, render=False)
+        # Every scene change below skips its own render; only the screenshot draws a frame
+        self._actor = self.plotter.add_mesh(mesh, color=self.color, show_edges=False,
+                                            reset_camera=False, render=False)
+        for view, path in outputs.items():
+            VIEWS[view](self.plotter)
+            self.plotter.reset_camera(render=False)
+            self.plotter.screenshot(path)
+        self.renders += 1
+
+    def close(self):
+        self.plotter.close()
+
+
+_renderer = None
+
+
+def get_renderer(window_size=(1920, 1080)):
+    """The renderer for this process, created on first use and reused afterwards."""
+    global _renderer
+    if _renderer is not None and _renderer.window_size != tuple(window_size):
+        _renderer.close()
+        _renderer = None
+    if _renderer is None:
+        _renderer = PartRenderer(window_size)
+    return _renderer
+
+
+@atexit.register
+def _close_renderer():
+    if _renderer is not None:
+        _renderer.close()
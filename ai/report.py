@@ -0,0 +1,157 @@
+import os
+import re
+import html
+import threading
+
+TABLE_BODY = "{{TABLE_BODY}}"
+
+_ROW = re.compile(r"<tr\b[^>]*>((?:(?!<tr\b).)*?)</tr\s*>", re.S | re.I)
+_CELL = re.compile(r"\s*<td\b[^>]*>([^<>]*)</td\s*>\s*", re.S | re.I)
+_FENCE = re.compile(r"^\s*```[\w-]*\s*$", re.M)
+
+_templates = {}
+
+
+def split_template(template_path="template.html"):
+    """(head, tail, columns) of a report template, split once at {{TABLE_BODY}}."""
+    if template_path not in _templates:
+        with open(template_path, "r", encoding="utf-8") as f:
+            text = f.read()
+        head, sep, tail = text.partition(TABLE_BODY)
+        if not sep:
+            raise ValueError(f"{template_path} has no {TABLE_BODY} placeholder")
+        columns = len(re.findall(r"<th\b", head, re.I)) or None
+        _templates[template_path] = (head, tail, columns)
+    return _templates[template_path]
+
+
+class RowParser:
+    """
+    Incremental parser for the model's table rows. feed() takes text as it
+    streams in and returns the rows completed so far, each as a list of
+    cell strings. A row must be <tr> holding exactly `columns` plain-text
+    <td> cells; anything else between rows besides whitespace and markdown
+    code fences is rejected and counted.
+    """
+
+    def __init__(self, columns=None, label=""):
+        self.columns = columns
+        self.label = label
+        self.rows = 0
+        self.rejected = []
+        self._buffer = ""
+
+    def feed(self, text):
+        self._buffer += text
+        rows = []
+        while True:
+            match = _ROW.search(self._buffer)
+            if match is None:
+                break
+            self._junk(self._buffer[:match.start()])
+            self._buffer = self._buffer[match.end():]
+            cells = self._cells(match.group(1))
+            if cells is None:
+                self._reject(match.group(0))
+            else:
+                self.rows += 1
+                rows.append(cells)
+        return rows
+
+    def close(self):
+        """End of the response: anything left is a truncated row or junk."""
+        self._junk(self._buffer)
+        self._buffer = ""
+        if self.rejected:
+            print(f"⚠️ {self.label}rejected {len(self.rejected)} malformed row(s)")
+
+    def _cells(self, body):
+        cells = []
+        pos = 0
+        while pos < len(body):
+            match = _CELL.match(body, pos)
+            if match is None:
+                if body[pos:].strip():
+                    return None  # stray text or markup inside the row
+                break
+            cells.append(" ".join(html.unescape(match.group(1)).split()))
+            pos = match.end()
+        if not cells or (self.columns is not None and len(cells) != self.columns):
+            return None
+        return cells
+
+    def _junk(self, text):
+        if _FENCE.sub("", text).strip():
+            self._reject(text)
+
+    def _reject(self, text):
+        text = text.strip()
+        self.rejected.append(text)
+        print(f"{self.label}rejected: {text[:120]!r}")
+
+
+class ReportWriter:
+    """
+    Writes <repo_name>_components.html as rows arrive: the template head
+    goes out first, each row is flushed as soon as it is written, and the
+    tail is added on close. Safe to write rows from several threads.
+    Rows go to <output_file>.part while they stream in; on close it replaces
+    the report, so an existing report is only overwritten by a complete
+    one. Call discard() (or leave the with block by an exception) to drop
+    the partial file instead. Rows written with an order key (e.g.
+    (batch, row)) arrive interleaved, so they are sorted by key on close.
+    """
+
+    def __init__(self, repo_name, template_path="template.html"):
+        self.head, self.tail, self.columns = split_template(template_path)
+        self.output_file = f"{repo_name}_components.html"
+        self.partial_file = self.output_file + ".part"
+        self.rows = 0
+        self._written = []
+        self._publish = True
+        self._lock = threading.Lock()
+        self._f = open(self.partial_file, "w", encoding="utf-8")
+        self._f.write(self.head)
+        self._f.flush()
+
+    @staticmethod
+    def _format(cells):
+        tds = "".join(f"<td>{html.escape(cell)}</td>" for cell in cells)
+        return f"<tr>{tds}</tr>\n        "
+
+    def write_row(self, cells, order=None):
+        line = self._format(cells)
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            self._written.append((order, self.rows, line))
+            self.rows += 1
+
+    def discard(self):
+        """Keep the existing report: close() removes the partial file instead of publishing it."""
+        self._publish = False
+
+    def close(self):
+        with self._lock:
+            if self._f.closed:
+                return
+            self._f.write(self.tail)
+            self._f.close()
+            if not self._publish:
+                os.unlink(self.partial_file)
+                return
+            if any(order is not None for order, _, _ in self._written):
+                ordered = sorted(self._written, key=lambda w: (w[0] is None, w[0] or (), w[1]))
+                with open(self.partial_file, "w", encoding="utf-8") as f:
+                    f.write(self.head)
+                    f.writelines(line for _, _, line in ordered)
+                    f.write(self.tail)
+            os.replace(self.partial_file, self.output_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            self.discard()
+        self.close()
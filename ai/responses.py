@@ -0,0 +1,62 @@
+import os
+import json
+import time
+import hashlib
+from cache import ArtifactCache
+
+# ---- CONFIG: cached model responses ----
+RESPONSE_TTL = 7 * 24 * 3600           # seconds before a cached answer is asked again
+MAX_RESPONSE_BYTES = 64 * 1024 ** 2
+# ----------------------------------------
+
+
+def file_identity(file_obj):
+    """Content hash of an uploaded file, falling back to its server name."""
+    return getattr(file_obj, "sha256_hash", None) or getattr(file_obj, "name", None) or repr(file_obj)
+
+
+def prompt_key(model, contents):
+    """Hash of a request: the model plus every text part by value and every file by content hash."""
+    h = hashlib.sha256(model.encode())
+    for part in contents:
+        kind, value = ("text", part) if isinstance(part, str) else ("file", file_identity(part))
+        h.update(json.dumps([kind, value], ensure_ascii=False).encode())
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """
+    Model answers keyed by model name plus every prompt part: text parts
+    (instructions, file labels, batch notes) by value, attached files by
+    content hash. Entries expire after ttl seconds and the store is kept
+    under max_bytes, least recently used first.
+    """
+
+    def __init__(self, ttl=RESPONSE_TTL, max_bytes=MAX_RESPONSE_BYTES):
+        self.ttl = ttl
+        self.store = ArtifactCache("responses", max_bytes=max_bytes)
+
+    def key(self, model, contents):
+        return prompt_key(model, contents)
+
+    def get(self, key):
+        """Cached response text for key, or None if missing or expired."""
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        with open(os.path.join(entry, "response.json"), "r", encoding="utf-8") as f:
+            record = json.load(f)
+        if time.time() - record["created"] > self.ttl:
+            self.store.delete(key)
+            self.store.hits -= 1
+            self.store.misses += 1
+            return None
+        return record["text"]
+
+    def put(self, key, text):
+        record = {"created": time.time(), "text": text}
+        self.store.delete(key)  # replaced on --refresh
+        self.store.put(key, {"response.json": json.dumps(record, ensure_ascii=False).encode("utf-8")})
+
+    def report(self):
+        self.store.report()
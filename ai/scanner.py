@@ -0,0 +1,115 @@
+import os
+import json
+import hashlib
+import tempfile
+from cache import CACHE_DIR, file_digest
+
+# ---- CONFIG: where per-folder manifests live ----
+MANIFEST_DIR = os.path.join(CACHE_DIR, "manifests")
+# -------------------------------------------------
+
+# Extensions written to file_list.txt
+LISTED_EXTENSIONS = ('.stp', '.dwg', '.pdf', '.xlsx')
+
+# Our own output folders, which bulk.py writes inside the customer folder
+SKIP_DIRS = ('generated_pngs', 'generated_stl', 'generated_stls')
+
+
+def iter_files(input_folder, extensions=None):
+    """
+    Yield (relative_path, abs_path, ext) for files under input_folder as soon
+    as they are found. extensions (lowercase, with dot) limits what is yielded.
+    """
+    stack = [input_folder]
+    while stack:
+        folder = stack.pop()
+        try:
+            entries = sorted(os.scandir(folder), key=lambda e: e.name)
+        except OSError as e:
+            print(f"Cannot scan {folder}: {e}")
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in SKIP_DIRS:
+                    subdirs.append(entry.path)
+            elif entry.is_file():
+                ext = os.path.splitext(entry.name)[-1].lower()
+                if extensions is None or ext in extensions:
+                    yield os.path.relpath(entry.path, input_folder), entry.path, ext
+        # Depth first, in name order
+        stack.extend(reversed(subdirs))
+
+
+def scan_files(input_folder, extensions=None):
+    """Return a list of (relative_path, abs_path, ext) for all files under input_folder"""
+    return list(iter_files(input_folder, extensions))
+
+
+class Manifest:
+    """
+    Persistent (size, mtime, sha256) per file of one folder, so a repeat
+    scan can tell which files were added or changed since the last run.
+    A file whose size and mtime match is trusted without hashing it.
+    """
+
+    def __init__(self, input_folder, path=None):
+        if path is None:
+            folder_id = hashlib.sha1(os.path.abspath(input_folder).encode()).hexdigest()
+            path = os.path.join(MANIFEST_DIR, folder_id + ".json")
+        self.path = path
+        self.entries = {}
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def check(self, rel_path, abs_path):
+        """Return (changed, entry). Pass entry to record() once the file has been processed."""
+        st = os.stat(abs_path)
+        old = self.entries.get(rel_path)
+        if old is not None and old["size"] == st.st_size and old["mtime"] == st.st_mtime_ns:
+            return False, old
+        entry = {"size": st.st_size, "mtime": st.st_mtime_ns, "sha256": file_digest(abs_path)}
+        # Touched but byte-identical files count as unchanged
+        return old is None or old["sha256"] != entry["sha256"], entry
+
+    def record(self, rel_path, entry):
+        self.entries[rel_path] = entry
+
+    def prune(self, seen):
+        """Forget files that were not seen in the last full scan. Returns the removed paths."""
+        removed = [p for p in self.entries if p not in seen]
+        for p in removed:
+            del self.entries[p]
+        return removed
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+
+def iter_changed_files(input_folder, manifest, extensions=None):
+    """
+    Like iter_files, but only yields files added or changed since the manifest
+    was last saved. Unchanged files are recorded as they are seen; changed ones
+    are recorded too, so call manifest.save() only after they were processed.
+    """
+    seen = set()
+    for rel_path, abs_path, ext in iter_files(input_folder, extensions):
+        seen.add(rel_path)
+        changed, entry = manifest.check(rel_path, abs_path)
+        manifest.record(rel_path, entry)
+        if changed:
+            yield rel_path, abs_path, ext
+    manifest.prune(seen)
+
+
+def write_file_list(input_folder, output_file='file_list.txt', extensions=LISTED_EXTENSIONS):
+    """Writes the relative paths of files with the given extensions to output_file."""
+    with open(output_file, 'w') as f:
+        for rel_path, _, _ in iter_files(input_folder, extensions):
+            f.write(f'{rel_path}\n')
+    print(f"File list generated at {output_file}")
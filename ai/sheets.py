@@ -0,0 +1,144 @@
+"""
+Contact sheets: the STEP renders of a job packed into a few tiled images.
+
+Instead of one 1920x1080 PNG upload per part, renders are scaled down to
+TILE_SIZE, captioned with their file name and laid out SHEET_COLUMNS x
+SHEET_ROWS per sheet, encoded as WebP (or optimised PNG). The views of one
+part stay on the same sheet. Parts are placed in path order, so the same
+folder gives byte-identical sheets and the upload index and response cache
+keep working. Turn on with QUOTE_CONTACT_SHEETS=1 or analyze --contact-sheets.
+"""
+import io
+import os
+import math
+from collections import Counter
+import lazy
+import tracing
+from conversion import view_image_paths
+
+# ---- CONFIG: contact sheets ----
+CONTACT_SHEETS = os.environ.get("QUOTE_CONTACT_SHEETS") == "1"
+SHEET_COLUMNS = 3
+SHEET_ROWS = 4
+TILE_SIZE = (640, 360)     # px per render, the 16:9 of WINDOW_SIZE
+LABEL_HEIGHT = 28          # px of caption under each tile
+SHEET_FORMAT = "webp"      # "webp" or "png"
+WEBP_QUALITY = 85
+# --------------------------------
+
+MIME_TYPES = {"webp": "image/webp", "png": "image/png"}
+
+
+class Sheet:
+    """One encoded contact sheet; tiles maps rel_path -> the caption of its first tile."""
+
+    def __init__(self, number, data, width, height, tiles, labels, source_bytes):
+        self.number = number
+        self.data = data
+        self.width = width
+        self.height = height
+        self.tiles = tiles
+        self.labels = labels
+        self.source_bytes = source_bytes
+        self.name = f"contact_sheet_{number}.{SHEET_FORMAT}"
+        self.mime_type = MIME_TYPES[SHEET_FORMAT]
+
+
+class Tile:
+    """An uploaded contact sheet as seen from one part: the sheet's file plus that part's caption."""
+
+    def __init__(self, file, sheet, label):
+        self.file = file
+        self.sheet = sheet
+        self.label = label
+
+    def __getattr__(self, name):
+        if name == "file":   # not set yet (copy, unpickling)
+            raise AttributeError(name)
+        return getattr(self.file, name)
+
+
+def _font():
+    ImageFont = lazy.load("PIL.ImageFont")
+    try:
+        return ImageFont.load_default(size=LABEL_HEIGHT - 8)
+    except TypeError:   # Pillow before 10.1 has a single bitmap size
+        return ImageFont.load_default()
+
+
+def _compose(entries):
+    """Lay (label, path) entries out on one sheet image."""
+    Image = lazy.load("PIL.Image")
+    ImageDraw = lazy.load("PIL.ImageDraw")
+    tile_w, tile_h = TILE_SIZE
+    cell_h = tile_h + LABEL_HEIGHT
+    rows = math.ceil(len(entries) / SHEET_COLUMNS)
+    sheet = Image.new("RGB", (SHEET_COLUMNS * tile_w, rows * cell_h), "white")
+    draw = ImageDraw.Draw(sheet)
+    font = _font()
+    for i, (label, path) in enumerate(entries):
+        x, y = i % SHEET_COLUMNS * tile_w, i // SHEET_COLUMNS * cell_h
+        with Image.open(path) as render:
+            render = render.convert("RGB")
+            render.thumbnail(TILE_SIZE)
+            sheet.paste(render, (x + (tile_w - render.width) // 2, y + (tile_h - render.height) // 2))
+        draw.rectangle((x, y, x + tile_w - 1, y + cell_h - 1), outline="#b0b0b0")
+        draw.text((x + 6, y + tile_h + 4), label, fill="black", font=font)
+    return sheet
+
+
+def _encode(image):
+    buffer = io.BytesIO()
+    if SHEET_FORMAT == "webp":
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY)
+    else:
+        image.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def plan_sheets(renders):
+    """
+    renders: dict rel_path -> path of the part's render (its first view).
+    Returns the sheets to draw, each a list of (rel_path, [(caption, path)
+    for each rendered view]), covering every part in path order. Tiles are
+    captioned with the file's stem, or with its path when several files
+    share the stem.
+    """
+    per_sheet = SHEET_COLUMNS * SHEET_ROWS
+    pages = [[]]   # per sheet: [(rel_path, [(label, path), ...])]
+    stems = Counter(os.path.splitext(os.path.basename(rel_path))[0] for rel_path in renders)
+    for rel_path in sorted(renders):
+        stem = os.path.splitext(os.path.basename(rel_path))[0]
+        if stems[stem] > 1:
+            stem = os.path.splitext(rel_path)[0].replace(os.sep, "/")
+        views = [(view, path) for view, path in view_image_paths(renders[rel_path]).items()
+                 if os.path.isfile(path)][:per_sheet]
+        entries = [(stem if len(views) == 1 else f"{stem} ({view})", path) for view, path in views]
+        if sum(len(e) for _, e in pages[-1]) + len(entries) > per_sheet:
+            pages.append([])
+        pages[-1].append((rel_path, entries))
+    return [page for page in pages if page]
+
+
+def render_sheet(number, page):
+    """Draw and encode one planned sheet. Sheets are independent, so they can be drawn on threads."""
+    entries = [entry for _, part in page for entry in part]
+    with tracing.span("contact_sheet", files=len(entries)) as s:
+        image = _compose(entries)
+        sheet = Sheet(number, _encode(image), image.width, image.height,
+                      {rel_path: part[0][0] for rel_path, part in page},
+                      [label for label, _ in entries],
+                      sum(os.path.getsize(path) for _, path in entries))
+        s.set(bytes_in=sheet.source_bytes, bytes_out=len(sheet.data))
+    return sheet
+
+
+def report(sheets, upload_seconds):
+    source = sum(s.source_bytes for s in sheets)
+    packed = sum(len(s.data) for s in sheets)
+    tiles = sum(len(s.labels) for s in sheets)
+    if not source:
+        return
+    print(f"contact sheets: {tiles} renders ({source / 1024 ** 2:.1f} MB) -> {len(sheets)} sheet(s) "
+          f"({packed / 1024 ** 2:.2f} MB), {1 - packed / source:.0%} fewer bytes and "
+          f"{tiles - len(sheets)} fewer uploads; sheet uploads took {upload_seconds:.2f}s")
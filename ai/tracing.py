@@ -0,0 +1,221 @@
+"""
+Spans and counters for the pipeline stages.
+
+Off unless configured, and then span() hands back one shared no-op object,
+so instrumented code costs an attribute lookup and a call. Turn it on with
+environment variables (inherited by the conversion workers) or configure():
+
+    QUOTE_TRACE=trace.jsonl       one JSON line per finished span
+    QUOTE_METRICS_PORT=9464       Prometheus text at http://localhost:9464/metrics
+
+    with tracing.span("upload", ext=".pdf") as s:
+        ...
+        s.set(bytes_out=size)
+    tracing.count("cache_hits", cache="conversions")
+
+Spans finished inside collected() (the conversion workers) are buffered
+and handed back to the parent with the result, where replay() exports them,
+so worker timings reach the parent's metrics endpoint.
+"""
+import os
+import json
+import time
+import itertools
+import threading
+
+# Numeric span attributes that are also summed into <attr>_total counters
+COUNTED_ATTRS = ("bytes_in", "bytes_out", "triangles", "rendered_triangles", "files")
+
+TRACE_PATH = os.environ.get("QUOTE_TRACE") or None
+METRICS_PORT = int(os.environ.get("QUOTE_METRICS_PORT") or 0) or None
+ENABLED = bool(TRACE_PATH or METRICS_PORT)
+
+_local = threading.local()
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_metrics = {}        # (name, labels) -> value
+_types = {}          # name -> "counter" | "summary"
+_server = None
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = _local.__dict__.setdefault("stack", [])
+        self.id = f"{os.getpid()}-{next(_ids)}"
+        self.parent = stack[-1].id if stack else None
+        stack.append(self)
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._t0
+        _local.stack.pop()
+        record = {"span": self.name, "id": self.id, "parent": self.parent, "pid": os.getpid(),
+                  "start": round(self.start, 6), "seconds": round(duration, 6), **self.attrs}
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        buffer = getattr(_local, "collecting", None)
+        if buffer is not None:
+            buffer.append(record)
+        else:
+            _export(record)
+        return False
+
+
+def span(name, **attrs):
+    """Time a block as span name; attrs (and later .set()) go into the record."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(name, attrs)
+
+
+def count(name, value=1, **labels):
+    """Add value to counter <name>_total."""
+    if ENABLED:
+        _add(name + "_total", "counter", labels, value)
+
+
+def _add(name, kind, labels, value):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _types[name] = kind
+        _metrics[key] = _metrics.get(key, 0) + value
+
+
+def _export(record):
+    labels = {"span": record["span"]}
+    _add("span_seconds_sum", "summary", labels, record["seconds"])
+    _add("span_seconds_count", "summary", labels, 1)
+    if "error" in record:
+        _add("span_errors_total", "counter", labels, 1)
+    for attr in COUNTED_ATTRS:
+        value = record.get(attr)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            _add(attr + "_total", "counter", labels, value)
+    if TRACE_PATH:
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        # One O_APPEND write per line keeps lines whole across threads and processes
+        fd = os.open(TRACE_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+class collected:
+    """Buffer the spans finished on this thread instead of exporting them."""
+
+    def __enter__(self):
+        self.spans = []
+        self._previous = getattr(_local, "collecting", None)
+        _local.collecting = self.spans
+        return self.spans
+
+    def __exit__(self, *exc):
+        _local.collecting = self._previous
+        return False
+
+
+def propagate(fn):
+    """Wrap fn so that, run on another thread, its spans land in this thread's collected() buffer."""
+    buffer = getattr(_local, "collecting", None)
+
+    def run(*args, **kwargs):
+        previous = getattr(_local, "collecting", None)
+        _local.collecting = buffer
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.collecting = previous
+    return run
+
+
+def replay(records):
+    """Export span records buffered by collected() in another process."""
+    for record in records or ():
+        _export(record)
+
+
+def configure(trace_path=None, metrics_port=None):
+    """Turn tracing on for this process and for workers started after this call."""
+    global TRACE_PATH, METRICS_PORT, ENABLED
+    if trace_path:
+        TRACE_PATH = os.path.abspath(trace_path)
+        os.environ["QUOTE_TRACE"] = TRACE_PATH
+    if metrics_port:
+        METRICS_PORT = metrics_port
+        os.environ["QUOTE_METRICS_PORT"] = str(metrics_port)
+    ENABLED = bool(TRACE_PATH or METRICS_PORT)
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
+
+
+def metrics_text():
+    """Every metric in Prometheus text exposition format."""
+    with _lock:
+        items = sorted(_metrics.items())
+        types = dict(_types)
+    lines = []
+    typed = set()
+    for (name, labels), value in items:
+        family = name.rsplit("_", 1)[0] if types[name] == "summary" else name
+        if family not in typed:
+            typed.add(family)
+            lines.append(f"# TYPE quote_{family} {types[name]}")
+        label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+        lines.append(f"quote_{name}{{{label_text}}} {value:g}" if label_text else f"quote_{name} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def serve_metrics(port=None):
+    """Serve metrics_text() at /metrics on a daemon thread (once per process)."""
+    global _server
+    if _server is not None:
+        return _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    _server = ThreadingHTTPServer(("127.0.0.1", METRICS_PORT if port is None else port), Handler)
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    print(f"Metrics at http://127.0.0.1:{_server.server_address[1]}/metrics")
+    return _server
@@ -0,0 +1,116 @@
+import os
+import json
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from cache import CACHE_DIR
+
+try:
+    import fcntl
+except ImportError:   # Windows: saves are not serialized between processes
+    fcntl = None
+
+# ---- CONFIG: persistent index of files already uploaded to Gemini ----
+INDEX_PATH = os.path.join(CACHE_DIR, "uploads.json")
+DEFAULT_TTL = timedelta(hours=47)       # Gemini keeps uploaded files for 48h
+EXPIRY_MARGIN = timedelta(minutes=30)   # don't reuse a handle that is about to expire
+# ----------------------------------------------------------------------
+
+
+class UploadIndex:
+    """
+    Maps a file's content hash to the Gemini file handle it was uploaded as.
+    Handles still alive on the server are reused instead of uploading the
+    same bytes again; expired or missing ones are dropped. Several indexes
+    on one file (concurrent daemon jobs, parallel runs) merge their changes
+    when they save, so none overwrites the uploads another recorded.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.reused = 0
+        self.uploaded = 0
+        self._lock = threading.Lock()
+        self._recorded = set()   # digests uploaded by this index since it was loaded
+        self._forgotten = {}     # digest -> name of a handle this index found dead
+        self._entries = self._read()
+
+    def _read(self):
+        if not os.path.isfile(self.path):
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def lookup(self, client, digest):
+        """Return a live file handle for digest, or None if it needs uploading."""
+        with self._lock:
+            entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        expires = datetime.fromisoformat(entry["expires"])
+        if expires - EXPIRY_MARGIN <= datetime.now(timezone.utc):
+            self.forget(digest)
+            return None
+        try:
+            obj = client.files.get(name=entry["name"])
+        except Exception:
+            # Deleted on the server side
+            self.forget(digest)
+            return None
+        with self._lock:
+            self.reused += 1
+        return obj
+
+    def record(self, digest, obj):
+        expires = getattr(obj, "expiration_time", None) or datetime.now(timezone.utc) + DEFAULT_TTL
+        with self._lock:
+            self.uploaded += 1
+            self._entries[digest] = {"name": obj.name, "expires": expires.isoformat()}
+            self._recorded.add(digest)
+            self._forgotten.pop(digest, None)
+
+    def forget(self, digest):
+        with self._lock:
+            entry = self._entries.pop(digest, None)
+            self._recorded.discard(digest)
+            if entry is not None:
+                self._forgotten[digest] = entry["name"]
+
+    @contextmanager
+    def _file_lock(self):
+        """Hold an exclusive lock on <path>.lock, so saves from other processes wait."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def save(self):
+        """
+        Merge this index's uploads and dropped handles into the index on disk
+        and write it atomically, dropping entries that have already expired.
+        """
+        now = datetime.now(timezone.utc)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._file_lock():
+            merged = self._read()
+            with self._lock:
+                for digest, name in self._forgotten.items():
+                    if merged.get(digest, {}).get("name") == name:
+                        del merged[digest]
+                for digest in self._recorded:
+                    merged[digest] = self._entries[digest]
+                live = {d: e for d, e in merged.items() if datetime.fromisoformat(e["expires"]) > now}
+                self._entries = dict(live)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(live, f, indent=1)
+            os.replace(tmp, self.path)
+
+    def report(self):
+        print(f"uploads: {self.reused} reused, {self.uploaded} uploaded")
@@ -0,0 +1,89 @@
+"""
+Run the solid-by-solid STEP tessellation (assembly.py) on a real OCCT
+assembly and check the mesh, the helper pool for large solids, the RSS-cap
+fallbacks and the geometry fingerprint. Needs cadquery.
+
+    python development/assembly_check.py [solids]
+"""
+import os
+import sys
+import shutil
+import multiprocessing
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ai"))
+import cadquery as cq
+import assembly
+import conversion
+import grouping
+
+SOLIDS = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+large = assembly.LARGE_SOLID_FACES
+
+
+def build(path, offset=0.0):
+    """An assembly of boxes and cylinders in a row, exported as one STEP file."""
+    parts = []
+    for i in range(SOLIDS):
+        wp = cq.Workplane().box(10, 8, 6) if i % 2 == 0 else cq.Workplane().cylinder(12, 4)
+        parts.append(wp.val().translate(cq.Vector(20 * i + offset, offset, 0)))
+    cq.exporters.export(cq.Workplane().add(cq.Compound.makeCompound(parts)), path)
+
+
+def main():
+    scratch = tempfile.mkdtemp(prefix="assembly_check_")
+    try:
+        check(scratch)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def check(scratch):
+    step = os.path.join(scratch, "fixture.step")
+    moved = os.path.join(scratch, "fixture-copy.step")
+    build(step)
+    build(moved, offset=100.0)
+
+    shape = conversion.load_step_shape(step)
+    tolerance = conversion.adaptive_tolerance(shape)
+    vertices, triangles, info = assembly.tessellate_assembly(shape, tolerance, conversion.STL_ANGULAR_TOLERANCE)
+    print(f"{info['solids']} solids: {len(vertices)} vertices, {len(triangles)} triangles at {tolerance:.3f} mm")
+    assert info["solids"] == SOLIDS and info["boxed"] == 0 and info["coarsened"] == 0
+    assert triangles.min() >= 0 and triangles.max() < len(vertices)
+    bb = shape.BoundingBox()
+    assert abs(vertices[:, 0].min() - bb.xmin) < 1e-3 and abs(vertices[:, 0].max() - bb.xmax) < 1e-3
+
+    # Every solid as a "large" one: meshed in the helper pool, same mesh
+    assembly.LARGE_SOLID_FACES = 0
+    offloaded, offloaded_triangles, info = assembly.tessellate_assembly(shape, tolerance,
+                                                                        conversion.STL_ANGULAR_TOLERANCE)
+    assembly.LARGE_SOLID_FACES = large
+    print(f"helper pool: {info['offloaded']} solids offloaded, {len(offloaded_triangles)} triangles")
+    assert info["offloaded"] == SOLIDS and len(offloaded_triangles) == len(triangles)
+    assert not multiprocessing.active_children(), "helper pool left running"
+    assert abs(offloaded[:, 0].min() - bb.xmin) < 1e-3 and abs(offloaded[:, 0].max() - bb.xmax) < 1e-3
+
+    # Three quarters of the way to the cap: halfway between COARSEN_FROM and the cap
+    rss = assembly.rss_bytes()
+    limit = int(rss / (assembly.COARSEN_FROM + (1 - assembly.COARSEN_FROM) / 2))
+    _, coarse, info = assembly.tessellate_assembly(shape, tolerance, conversion.STL_ANGULAR_TOLERANCE, limit)
+    print(f"near the cap: {len(coarse)} triangles, {info['coarsened']} coarsened up to {info['max_tolerance']:.3f} mm")
+    assert info["coarsened"] == SOLIDS and info["boxed"] == 0 and len(coarse) <= len(triangles)
+
+    _, boxes, info = assembly.tessellate_assembly(shape, tolerance, conversion.STL_ANGULAR_TOLERANCE, rss // 2)
+    print(f"over the cap: {info['boxed']} solids drawn as boxes")
+    assert info["boxed"] == SOLIDS and len(boxes) == 12 * SOLIDS
+
+    stl = os.path.join(scratch, "fixture.stl")
+    conversion.write_binary_stl(stl, vertices, triangles)
+    assert os.path.getsize(stl) == 84 + 50 * len(triangles)
+
+    fingerprint = grouping.shape_fingerprint(shape)
+    assert grouping.shape_fingerprint(conversion.load_step_shape(moved)) == fingerprint, "moved copy differs"
+    other = cq.Workplane().box(10, 8, 7).val()
+    assert grouping.shape_fingerprint(other) != fingerprint
+    print("fingerprint: moved copy matches, a different part does not")
+
+
+if __name__ == "__main__":   # helper processes import this script when spawned
+    main()
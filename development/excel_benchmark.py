@@ -0,0 +1,30 @@
+"""
+Time the streaming openpyxl → CSV path against the old pandas path.
+
+    python development/excel_benchmark.py path/to/BOM.xlsx [more.xlsx ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ai"))
+from excel import workbook_to_csv, pandas_workbook_to_csv
+
+ROUNDS = 5
+
+
+def best_of(fn, path):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        text = fn(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(text.encode("utf-8"))
+
+
+for path in sys.argv[1:]:
+    fast, fast_bytes = best_of(workbook_to_csv, path)
+    slow, slow_bytes = best_of(pandas_workbook_to_csv, path)
+    print(f"{os.path.basename(path)}: openpyxl {fast * 1000:.1f} ms ({fast_bytes} B), "
+          f"pandas {slow * 1000:.1f} ms ({slow_bytes} B), {slow / fast:.1f}x")
@@ -0,0 +1,51 @@
+"""
+Drive GeminiClient against the fake client with injected transient errors
+and check every call still succeeds.
+
+    python development/gemini_faults.py [failure_rate] [calls]
+"""
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ai"))
+from gemini import GeminiClient, is_retryable
+from fakes import FakeClient, FakeModels, transport_error
+from components import ComponentParser
+
+FAILURE_RATE = float(sys.argv[1]) if len(sys.argv) > 1 else 0.3
+CALLS = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+# One in three injected failures is a dropped connection, an httpx.ReadError when httpx is installed
+dropped = transport_error()
+print(f"dropped connections raise {type(dropped).__module__}.{type(dropped).__name__}")
+assert is_retryable(dropped)
+
+fake = FakeClient(models=FakeModels(base_latency=0.05, failure_rate=FAILURE_RATE), failure_rate=FAILURE_RATE)
+client = GeminiClient(fake, rate=50, burst=20, max_in_flight=8, max_attempts=8,
+                      backoff_base=0.05, backoff_max=0.5)
+
+
+def one_call(i):
+    payload = f"part,{i}\n".encode() * 100
+    obj = client.files.upload(file=io.BytesIO(payload), config=dict(mime_type="text/csv"))
+    assert obj.size_bytes == len(payload), "upload was not rewound before a retry"
+    response = client.models.generate_content(model="fake", contents=[f"--- FILE: p{i}.csv ---", obj, "rows"])
+    parser = ComponentParser()
+    parser.feed(response.text)
+    parser.close()
+    return len(parser.components)
+
+
+start = time.perf_counter()
+with ThreadPoolExecutor(max_workers=16) as pool:
+    rows = sum(pool.map(one_call, range(CALLS)))
+elapsed = time.perf_counter() - start
+
+client.stats.report()
+client.close()
+print(f"{CALLS} uploads + {CALLS} generate calls at {FAILURE_RATE:.0%} failures: "
+      f"{rows} rows in {elapsed:.2f}s, {fake.files.upload_count} files stored")
+assert rows == CALLS and fake.files.upload_count == CALLS
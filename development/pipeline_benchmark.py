@@ -0,0 +1,298 @@
+"""
+End-to-end benchmark of the quoting pipeline on synthetic customer folders.
+
+Each folder holds STEP solids built from cadquery primitives (a few are
+renamed copies, like customers send), a drawing PDF per part and an xlsx
+BOM. Uploads and the model run on fakes.FakeClient, so only local work is
+measured. Per stage it records wall time, CPU time (this process plus
+finished workers), peak RSS of the process tree and files per second, and
+writes everything to JSON.
+
+    python development/pipeline_benchmark.py [--sizes small,medium] [--out FILE]
+    python development/pipeline_benchmark.py --compare old.json [--threshold 0.2]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import importlib.util
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+
+# Everything the pipeline caches or stores goes to a scratch dir, so each run is cold
+SCRATCH = tempfile.mkdtemp(prefix="pipeline_bench_")
+os.environ["QUOTE_CACHE_DIR"] = os.path.join(SCRATCH, "cache")
+os.environ["QUOTE_STORE"] = os.path.join(SCRATCH, "components.sqlite")
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(REPO, "ai"))
+import lazy
+
+SIZES = {"small": 10, "medium": 50, "large": 200}   # parts per folder
+DUPLICATE_EVERY = 7        # every 7th part is a renamed copy of the one before
+SAMPLE_INTERVAL = 0.05     # seconds between RSS samples
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+# Minimal one-page PDF; the part name goes in a comment so every file hashes differently
+_PDF = ("%PDF-1.4\n% {name}\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+        "2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+        "3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 842 595]>>endobj\n"
+        "trailer<</Root 1 0 R>>\n%%EOF\n")
+
+
+# ---- synthetic folders ----
+
+def make_step(cq, i):
+    """A plate, bracket or shaft whose dimensions depend on i."""
+    kind = i % 3
+    if kind == 0:
+        return (cq.Workplane("XY").box(40 + i % 11 * 5, 30 + i % 7 * 4, 8)
+                .faces(">Z").workplane().rarray(20, 15, 2, 2).hole(4 + i % 3))
+    if kind == 1:
+        return (cq.Workplane("XY").box(50, 10, 30 + i % 5 * 6)
+                .faces(">Y").workplane().hole(6).edges("|Y").fillet(2))
+    return (cq.Workplane("XY").circle(6 + i % 4).extrude(60 + i % 9 * 10)
+            .faces(">Z").workplane().circle(3).cutBlind(-10))
+
+
+def make_folder(root, parts):
+    """Write a customer folder with `parts` parts. Returns the number of files."""
+    openpyxl = lazy.load("openpyxl")
+    try:
+        cq = lazy.load("cadquery")
+    except ImportError:
+        cq = None
+        print("cadquery is not installed: the folder has no STEP files")
+    os.makedirs(os.path.join(root, "3D"), exist_ok=True)
+    os.makedirs(os.path.join(root, "2D"), exist_ok=True)
+
+    names = [f"bench-{i:04d}" for i in range(parts)]
+    previous = None
+    for i, name in enumerate(names):
+        if cq is not None:
+            path = os.path.join(root, "3D", name + ".stp")
+            if previous is not None and i % DUPLICATE_EVERY == 0:
+                shutil.copyfile(previous, path)
+            else:
+                cq.exporters.export(make_step(cq, i), path, exportType="STEP")   # .stp is not auto-detected
+            previous = path
+        with open(os.path.join(root, "2D", name + ".pdf"), "w") as f:
+            f.write(_PDF.format(name=name))
+
+    wb = openpyxl.Workbook(write_only=True)
+    sheet = wb.create_sheet("BOM")
+    sheet.append(["序号", "产品名称", "材料", "数量", "规格"])
+    for i, name in enumerate(names):
+        sheet.append([i + 1, name, ["AL6061", "45", "SUS304", "POM"][i % 4], 1 + i % 6, "黑色阳极氧化"])
+    wb.save(os.path.join(root, "BOM.xlsx"))
+    return sum(len(files) for _, _, files in os.walk(root))
+
+
+# ---- measurement ----
+
+def tree_rss(pid=None):
+    """Resident bytes of a process and all of its descendants (Linux /proc)."""
+    total = 0
+    stack = [pid or os.getpid()]
+    while stack:
+        p = stack.pop()
+        try:
+            with open(f"/proc/{p}/statm") as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE
+            for task in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{task}/children") as f:
+                    stack.extend(int(c) for c in f.read().split())
+        except OSError:
+            continue
+    return total
+
+
+class Stage:
+    """Context manager measuring one pipeline stage."""
+
+    def __init__(self, name, files):
+        self.name = name
+        self.files = files
+        self.result = None
+
+    def _sample(self):
+        while not self._done.wait(SAMPLE_INTERVAL):
+            self._peak = max(self._peak, tree_rss())
+
+    def __enter__(self):
+        self._peak = tree_rss()
+        self._done = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        self._cpu = self._cpu_now()
+        self._wall = time.perf_counter()
+        return self
+
+    @staticmethod
+    def _cpu_now():
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall
+        cpu = self._cpu_now() - self._cpu
+        self._done.set()
+        self._sampler.join()
+        self.result = {
+            "wall_s": round(wall, 4),
+            "cpu_s": round(cpu, 4),
+            "peak_rss_mb": round(max(self._peak, tree_rss()) / 1024 ** 2, 1),
+            "files": self.files,
+            "files_per_s": round(self.files / wall, 2) if wall > 0 else None,
+        }
+        print(f"  {self.name:<10} {wall:7.2f}s wall {cpu:7.2f}s cpu "
+              f"{self.result['peak_rss_mb']:7.1f} MB  {self.result['files_per_s']} files/s")
+
+
+# ---- pipeline stages ----
+
+def run_pipeline(folder, workers):
+    import bulk2
+    import grouping
+    import prompts
+    import conversion
+    from cache import ArtifactCache
+    from components import ComponentStore
+    from fakes import FakeClient, FakeModels
+    from scanner import scan_files
+
+    stages = {}
+    client = FakeClient(models=FakeModels(base_latency=0, seconds_per_1k_tokens=0))
+    repo_name = os.path.basename(folder)
+
+    file_list = scan_files(folder)   # warm the directory cache
+    with Stage("scan", len(file_list)) as s:
+        file_list = scan_files(folder)
+    stages["scan"] = s.result
+
+    excels = [f for f in file_list if f[2] in (".xls", ".xlsx")]
+    with Stage("excel", len(excels)) as s:
+        for _, abs_path, _ in excels:
+            conversion.excel_to_csv(abs_path)
+    stages["excel"] = s.result
+
+    png_dir = os.path.join(SCRATCH, "png")
+    stl_dir = os.path.join(SCRATCH, "stl")
+    fingerprints = {}
+    # Pools are shut down inside each stage, so their CPU time is counted
+    with Stage("convert", len(file_list)) as s:
+        with conversion.conversion_pool(workers) as pool:
+            uploaded_files = conversion.upload_files(file_list, client, png_dir, stl_dir,
+                                                     cache=ArtifactCache("conversions"), converters=pool,
+                                                     fingerprints=fingerprints)
+    stages["convert"] = s.result
+    stages["convert"]["failed"] = sum(1 for obj in uploaded_files.values() if obj is None)
+
+    with Stage("group", len(fingerprints)) as s:
+        groups, duplicates = grouping.group_files(file_list, fingerprints)
+    stages["group"] = s.result
+    stages["group"]["duplicates"] = len(duplicates)
+    with Stage("prompts", len(uploaded_files)) as s:
+        batches = prompts.plan_batches(uploaded_files, groups)
+        for batch in batches:
+            prompts.build_contents(uploaded_files, repo_name, "", batch)
+    stages["prompts"] = s.result
+    stages["prompts"]["batches"] = len(batches)
+
+    with Stage("analyze", len(uploaded_files)) as s:
+        with ComponentStore() as store:
+            bulk2.analyze_uploaded_files(uploaded_files, repo_name, client, groups, store=store)
+    stages["analyze"] = s.result
+    return stages
+
+
+# ---- results ----
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "cadquery": importlib.util.find_spec("cadquery") is not None,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(old_path, new, threshold):
+    """Print per-stage wall time changes; returns the stages slower by more than threshold."""
+    with open(old_path, "r") as f:
+        old = json.load(f)
+    regressions = []
+    for size, run in new["runs"].items():
+        before = old["runs"].get(size)
+        if before is None:
+            continue
+        for stage, result in run["stages"].items():
+            prev = before["stages"].get(stage)
+            if not prev or not prev["wall_s"]:
+                continue
+            change = result["wall_s"] / prev["wall_s"] - 1
+            flag = ""
+            # Ignore noise on stages that take a few milliseconds
+            if change > threshold and result["wall_s"] - prev["wall_s"] > 0.05:
+                flag = "  <-- regression"
+                regressions.append(f"{size}/{stage}")
+            print(f"{size:<7} {stage:<10} {prev['wall_s']:8.3f}s -> {result['wall_s']:8.3f}s {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    from conversion import CONVERT_WORKERS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="small,medium", help=f"comma separated, from {', '.join(SIZES)}")
+    parser.add_argument("--workers", type=int, default=CONVERT_WORKERS)
+    parser.add_argument("--out", help="JSON results file (default: development/benchmarks/<time>.json)")
+    parser.add_argument("--compare", metavar="OLD_JSON", help="compare against an earlier results file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    results = {"environment": environment(), "runs": {}}
+    cwd = os.getcwd()
+    try:
+        for size in args.sizes.split(","):
+            folder = os.path.join(SCRATCH, "folders", f"{size}_folder")
+            started = time.perf_counter()
+            files = make_folder(folder, SIZES[size])
+            print(f"{size}: {files} files generated in {time.perf_counter() - started:.1f}s")
+            # analyze writes <name>_components.html into the working directory
+            os.chdir(SCRATCH)
+            shutil.copyfile(os.path.join(REPO, "template.html"), "template.html")
+            stages = run_pipeline(folder, args.workers)
+            os.chdir(cwd)
+            results["runs"][size] = {"parts": SIZES[size], "files": files, "stages": stages}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(SCRATCH, ignore_errors=True)
+
+    out = args.out or os.path.join(REPO, "development", "benchmarks", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {out}")
+
+    if args.compare:
+        regressions = compare(args.compare, results, args.threshold)
+        if regressions:
+            sys.exit(f"Regressions: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Compare one big generate_content call against token-budgeted batches sent
+concurrently, on the offline fake model client.
+
+    python development/prompt_benchmark.py [parts] [budget]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ai"))
+import prompts
+from fakes import FakeClient, FakeFile
+
+PARTS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+BUDGET = int(sys.argv[2]) if len(sys.argv) > 2 else prompts.TOKEN_BUDGET
+
+# A synthetic folder: every part has a render and a drawing, some also a BOM
+uploaded_files = {}
+for i in range(PARTS):
+    uploaded_files[f"parts/p{i:04d}.stp"] = FakeFile(f"files/r{i}", "image/png", 200_000, None)
+    uploaded_files[f"drawings/p{i:04d}.pdf"] = FakeFile(f"files/d{i}", "application/pdf", 250_000, None)
+    if i % 10 == 0:
+        uploaded_files[f"bom/p{i:04d}.xlsx"] = FakeFile(f"files/b{i}", "text/csv", 6_000, None)
+
+
+def run(budget):
+    client = FakeClient()
+    batches = prompts.plan_batches(uploaded_files, budget=budget)
+    start = time.perf_counter()
+    texts = prompts.generate_batches(batches, uploaded_files, "bench", "rows please", client)
+    elapsed = time.perf_counter() - start
+    rows = sum(t.count('"part_name"') for t in texts if t)
+    return elapsed, len(batches), rows, client.models.max_in_flight
+
+
+single = run(float("inf"))
+batched = run(BUDGET)
+for label, (elapsed, batches, rows, in_flight) in (("single", single), ("batched", batched)):
+    print(f"{label}: {batches} request(s), {in_flight} in flight, {rows} rows, {elapsed:.2f} s")
+print(f"{single[0] / batched[0]:.1f}x")
@@ -0,0 +1,103 @@
+"""
+Compare one upload per STEP render against contact sheets (sheets.py).
+
+Builds a folder of placeholder .stp files and seeds the conversion cache
+with synthetic shaded 1920x1080 renders, so no cadquery is needed and the
+renders go through the real upload_files path. Uploads go to
+fakes.FakeFiles with a per-request latency and a bandwidth limit.
+
+    python development/sheet_benchmark.py [parts] [--mbps 20] [--latency 0.3]
+
+Renders cover every view in conversion.RENDER_VIEWS.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+SCRATCH = tempfile.mkdtemp(prefix="sheet_bench_")
+os.environ["QUOTE_CACHE_DIR"] = os.path.join(SCRATCH, "cache")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ai"))
+import numpy as np
+from PIL import Image
+
+
+def synthetic_render(path, seed, size=(1920, 1080)):
+    """A few shaded ellipsoids on a grey background, compressing about like a real render."""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    image = np.full((h, w, 3), 76, dtype=np.float32)
+    for _ in range(4):
+        cx, cy = rng.uniform(0.2, 0.8) * w, rng.uniform(0.2, 0.8) * h
+        rx, ry = rng.uniform(0.08, 0.25) * w, rng.uniform(0.1, 0.35) * h
+        # Shade only the part of the image inside the ellipse's bounding box
+        x0, x1 = max(0, int(cx - rx)), min(w, int(cx + rx) + 1)
+        y0, y1 = max(0, int(cy - ry)), min(h, int(cy + ry) + 1)
+        y, x = np.mgrid[y0:y1, x0:x1].astype(np.float32)
+        d = ((x - cx) / rx) ** 2 + ((y - cy) / ry) ** 2
+        inside = d < 1
+        shade = np.sqrt(np.clip(1 - d, 0, 1)) * 0.7 + 0.3 * (1 - (y - cy + ry) / (2 * ry))
+        image[y0:y1, x0:x1][inside] = np.array([210, 180, 140]) * shade[inside, None]
+    Image.fromarray(np.clip(image, 0, 255).astype(np.uint8)).save(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("parts", type=int, nargs="?", default=40)
+    parser.add_argument("--mbps", type=float, default=20, help="simulated upload bandwidth, megabit/s")
+    parser.add_argument("--latency", type=float, default=0.3, help="simulated seconds per upload request")
+    args = parser.parse_args()
+
+    import conversion
+    import prompts
+    import sheets
+    from cache import ArtifactCache
+    from fakes import FakeClient, FakeFiles
+    from scanner import scan_files
+
+    folder = os.path.join(SCRATCH, "job")
+    os.makedirs(folder)
+    cache = ArtifactCache("conversions")
+    renders = os.path.join(SCRATCH, "renders")
+    os.makedirs(renders)
+    started = time.perf_counter()
+    for i in range(args.parts):
+        stp = os.path.join(folder, f"part-{i:03d}.stp")
+        with open(stp, "w") as f:
+            f.write(f"ISO-10303-21; placeholder {i}\n")
+        files = {}
+        for j, view in enumerate(conversion.RENDER_VIEWS):
+            path = os.path.join(renders, f"{i}_{view}.png")
+            synthetic_render(path, seed=i * 10 + j)
+            files[f"view_{view}.png"] = path
+        cache.put(cache.key(stp, conversion.render_settings()), files)
+    print(f"{args.parts} parts x {len(conversion.RENDER_VIEWS)} view(s) rendered in "
+          f"{time.perf_counter() - started:.1f}s")
+
+    try:
+        results = {}
+        for label, contact_sheets in (("per render", False), ("contact sheets", True)):
+            files = FakeFiles(latency=args.latency, bytes_per_second=args.mbps * 1e6 / 8)
+            client = FakeClient(files=files)
+            start = time.perf_counter()
+            uploaded = conversion.upload_files(scan_files(folder), client, png_dir=os.path.join(SCRATCH, "png"),
+                                               cache=cache, contact_sheets=contact_sheets)
+            elapsed = time.perf_counter() - start
+            tokens = sum(prompts.group_tokens(g, uploaded) for g in prompts.stem_groups(uploaded))
+            results[label] = (files.upload_count, files.uploaded_bytes, elapsed, tokens)
+        print()
+        for label, (count, size, elapsed, tokens) in results.items():
+            print(f"{label:<15} {count:4d} uploads {size / 1024 ** 2:8.2f} MB {elapsed:7.2f}s "
+                  f"~{tokens} prompt tokens")
+        (c0, b0, t0, k0), (c1, b1, t1, k1) = results.values()
+        print(f"bytes {b1 / b0 - 1:+.0%}, uploads {c1 - c0:+d}, upload time {t1 / t0 - 1:+.0%}, "
+              f"prompt tokens {k1 / k0 - 1:+.0%} ({sheets.SHEET_FORMAT}, "
+              f"{sheets.SHEET_COLUMNS}x{sheets.SHEET_ROWS} tiles of {sheets.TILE_SIZE[0]}x{sheets.TILE_SIZE[1]})")
+    finally:
+        shutil.rmtree(SCRATCH, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()